@@ -0,0 +1,86 @@
+"""
+Benchmark the shared color math in nodes/functions_color.py.
+Times the scalar per-color loops against the numpy and torch array versions;
+tests/test_functions_color.py checks that they agree.
+
+Usage: python benchmarks/bench_color_math.py [num_colors]
+"""
+import os
+import sys
+import time
+import colorsys
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nodes.functions_color import (
+    relative_luminance, relative_luminance_array, rgb_to_hex, rgb_to_hex_array, rgb_to_hsv_array,
+)
+
+
+# 不查表的亮度公式，作为查表结果的参照
+def formula_luminance(r, g, b):
+    r, g, b = (c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4 for c in (r / 255.0, g / 255.0, b / 255.0))
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def scalar_hsv(colors):
+    return [colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0) for r, g, b in colors]
+
+
+def scalar_luminance(colors):
+    return [formula_luminance(r, g, b) for r, g, b in colors]
+
+
+def cached_luminance(colors):
+    return [relative_luminance(r, g, b) for r, g, b in colors]
+
+
+def scalar_hex(colors):
+    return [rgb_to_hex(color) for color in colors]
+
+
+def main():
+    num_colors = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(42)
+
+    rgb = rng.integers(0, 256, (num_colors, 3))
+    colors = [tuple(color) for color in rgb.tolist()]
+    rgb_tensor = torch.from_numpy(rgb).float()
+    print(f"[BK_Node] ○ INPUT {num_colors} colors, torch {torch.__version__}")
+    print(f"{'operation':<22}{'scalar':>10}{'numpy':>10}{'torch':>10}{'speedup':>10}")
+
+    rows = [
+        ("rgb_to_hsv", scalar_hsv, rgb_to_hsv_array),
+        ("relative_luminance", scalar_luminance, relative_luminance_array),
+    ]
+    for name, scalar, vectorised in rows:
+        _, scalar_time = timed(scalar, colors)
+        _, numpy_time = timed(vectorised, rgb)
+        _, torch_time = timed(vectorised, rgb_tensor)
+        print(f"{name:<22}{scalar_time:>9.3f}s{numpy_time:>9.3f}s{torch_time:>9.3f}s"
+              f"{scalar_time / min(numpy_time, torch_time):>9.1f}x")
+
+    # Repeated colors, as in palettes and swatches, hit the memoised scalar luminance
+    repeated = colors[:1000] * (num_colors // 1000)
+    _, scalar_time = timed(scalar_luminance, repeated)
+    _, cached_time = timed(cached_luminance, repeated)
+    _, table_time = timed(relative_luminance_array, rgb.astype(np.uint8))
+    print(f"{'luminance (formula)':<22}{scalar_time:>9.3f}s")
+    print(f"{'luminance (memoised)':<22}{cached_time:>9.3f}s{'':>20}{scalar_time / cached_time:>9.1f}x")
+    print(f"{'luminance (uint8 LUT)':<22}{'':>10}{table_time:>9.3f}s")
+
+    _, scalar_time = timed(scalar_hex, colors)
+    _, numpy_time = timed(rgb_to_hex_array, rgb)
+    print(f"{'rgb_to_hex':<22}{scalar_time:>9.3f}s{numpy_time:>9.3f}s{'-':>10}{scalar_time / numpy_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark the tensor/PIL bridge in nodes/functions_image.py.
+Checks the batch converters against the per-image tensor2pil/pil2tensor they
+replace, then runs every conversion in a fresh process and reports its time and
+peak memory above the input, in multiples of the float32 batch.
+
+Usage: python benchmarks/bench_image_bridge.py [frames] [size]
+"""
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nodes.functions_image import pil2tensor_batch, tensor2pil_batch
+
+
+# 改动前的逐张转换，作为参照
+def legacy_tensor2pil(image):
+    return Image.fromarray(np.clip(255. * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+
+
+def legacy_pil2tensor(image):
+    return torch.from_numpy(np.array(image).astype(np.float32) / 255.0).unsqueeze(0)
+
+
+def legacy_to_pil(images):
+    return [legacy_tensor2pil(image) for image in images]
+
+
+def legacy_to_tensor(images):
+    return torch.cat([legacy_pil2tensor(image) for image in images])
+
+
+CASES = {
+    "to_pil (per image)": ("tensor", legacy_to_pil),
+    "to_pil (batch)": ("tensor", tensor2pil_batch),
+    "to_tensor (per image)": ("pil", legacy_to_tensor),
+    "to_tensor (batch)": ("pil", pil2tensor_batch),
+}
+
+
+def make_batch(frames, size, channels=4):
+    generator = torch.Generator().manual_seed(42)
+    return torch.rand((frames, size, size, channels), generator=generator)
+
+
+def peak_rss():
+    """Peak resident memory of this process, in bytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# 在独立进程中运行单个转换，避免内存峰值相互影响
+def run_case(name, frames, size):
+    kind, function = CASES[name]
+    batch = make_batch(frames, size)
+    source = batch if kind == "tensor" else tensor2pil_batch(batch)
+    if kind == "pil":
+        # Own the pixels, so the batch buffer can be freed
+        source = [image.copy() for image in source]
+    del batch
+
+    baseline = current_rss()
+    start = time.perf_counter()
+    result = function(source)
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed} {peak_rss() - baseline}")
+    return result
+
+
+def check(frames=3, size=37):
+    """Raise if a batch converter disagrees with the per-image conversions"""
+    for channels in (1, 3, 4):
+        batch = make_batch(frames, size, channels) * 1.2 - 0.1
+        legacy = legacy_to_pil(batch)
+        converted = tensor2pil_batch(batch)
+        assert all(a.mode == b.mode and np.array_equal(np.asarray(a), np.asarray(b))
+                   for a, b in zip(legacy, converted)), f"tensor2pil_batch ({channels} channels)"
+
+        expected = legacy_to_tensor(legacy)
+        assert torch.equal(pil2tensor_batch(legacy), expected), f"pil2tensor_batch ({channels} channels)"
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--case":
+        run_case(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+
+    check()
+    print("[BK_Node] ○ CHECK Batch converters match the per-image conversions")
+
+    batch_bytes = frames * size * size * 4 * 4
+    print(f"[BK_Node] ○ INPUT {frames} RGBA frames of {size}x{size}, float32 batch {batch_bytes / (1 << 20):.0f} MB")
+    print(f"{'conversion':<24}{'time':>10}{'peak MB':>10}{'batches':>10}")
+    for name in CASES:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", name, str(frames), str(size)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        elapsed, peak = float(output[-2]), int(output[-1])
+        print(f"{name:<24}{elapsed:>9.3f}s{peak / (1 << 20):>10.0f}{peak / batch_bytes:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
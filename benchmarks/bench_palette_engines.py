@@ -0,0 +1,72 @@
+"""
+Benchmark the BK_Img2Color palette engines.
+Reports runtime and palette error (mean squared distance of every pixel to its
+nearest palette color, in 0-255 units) for each engine.
+
+Usage: python benchmarks/bench_palette_engines.py [image_path] [num_colors]
+"""
+import os
+import sys
+import time
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nodes.functions_palette import PALETTE_ENGINES, STREAMING_ENGINES, TENSOR_ENGINES, streaming_chunk_size
+
+
+# 生成带渐变和色块的测试图像
+def synthetic_image(size: int = 1024) -> torch.Tensor:
+    """Smooth gradients with a few flat color blocks and mild noise"""
+    rng = np.random.default_rng(42)
+    y, x = np.mgrid[0:size, 0:size] / size
+    image = np.stack([x, y, 1 - x * y], axis=-1)
+    blocks = [(0.9, 0.1, 0.2), (0.1, 0.6, 0.3), (0.95, 0.85, 0.2)]
+    for i, color in enumerate(blocks):
+        start = int(size * (0.1 + 0.3 * i))
+        image[start:start + size // 5, start:start + size // 5] = color
+    image += rng.normal(0, 0.02, image.shape)
+    return torch.from_numpy(np.clip(image, 0, 1).astype(np.float32)).unsqueeze(0)
+
+
+def load_image(path: str) -> torch.Tensor:
+    array = np.asarray(Image.open(path).convert("RGB"), dtype=np.float32) / 255.0
+    return torch.from_numpy(array).unsqueeze(0)
+
+
+def palette_error(pixels: np.ndarray, centers: np.ndarray, sample: int = 200_000) -> float:
+    """Mean squared distance to the nearest palette color on a pixel subsample"""
+    rng = np.random.default_rng(0)
+    if len(pixels) > sample:
+        pixels = pixels[rng.choice(len(pixels), sample, replace=False)]
+    distances = ((pixels[:, None, :] - centers[None, :, :]) * 255.0) ** 2
+    return float(distances.sum(axis=-1).min(axis=1).mean())
+
+
+def main():
+    image = load_image(sys.argv[1]) if len(sys.argv) > 1 else synthetic_image()
+    num_colors = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    max_iterations = int(512 * 0.8)
+    n_init = max(1, min(10, int(max_iterations / 100)))
+
+    pixels = image[..., :3].reshape(-1, 3).numpy()
+    print(f"Image {tuple(image.shape)}, {len(pixels)} pixels, {num_colors} colors")
+    print(f"{'engine':<12} {'time (s)':>10} {'error':>10}")
+
+    for name, engine in PALETTE_ENGINES.items():
+        start = time.perf_counter()
+        if name in STREAMING_ENGINES:
+            centers, _ = engine(image.reshape(-1, image.shape[-1]), num_colors, max_iterations, n_init,
+                                streaming_chunk_size(num_colors))
+        elif name in TENSOR_ENGINES:
+            centers, _ = engine(image.reshape(-1, image.shape[-1]), num_colors, max_iterations, n_init)
+        else:
+            centers, _ = engine(pixels, num_colors, max_iterations, n_init)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12} {elapsed:>10.3f} {palette_error(pixels, np.asarray(centers)):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,8 @@ node_module_mappings = {
     'node_color_limit': 'BK_ColorLimit',
     'node_color_contrast': 'BK_ColorContrast',
     'node_color_luminance': 'BK_ColorLuminance',
+    'node_color_contrast_map': 'BK_ColorContrastMap',
+    'node_color_contrast_matrix': 'BK_ColorContrastMatrix',
     'node_image_aspect_filter': 'BK_ImageAspectFilter',
     # 'node_image_to_svg': 'BK_ImageToSVG',
     'node_image_random_layout': "BK_ImageRandomLayout",
@@ -42,6 +44,8 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "BK_ColorLimit": "BK Color Limit",
     "BK_ColorContrast":  "BK Color Contrast",
     "BK_ColorLuminance":  "BK Color Luminance",
+    "BK_ColorContrastMap": "BK Color Contrast Map",
+    "BK_ColorContrastMatrix": "BK Color Contrast Matrix",
     "BK_GradientImage": "BK Gradient Image",
     "BK_ImageAspectFilter": "BK Image Aspect Filter",
     # "BK_ImageToSVG": "BK Image To SVG",
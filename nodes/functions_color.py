@@ -1,16 +1,11 @@
+import re
 import colorsys
+from functools import lru_cache
+import numpy as np
+import torch
 
-# 计算颜色亮度
-def relative_luminance(r, g, b):
-    r = r / 255.0
-    g = g / 255.0
-    b = b / 255.0
-
-    r = r / 12.92 if r <= 0.03928 else ((r + 0.055) / 1.055) ** 2.4
-    g = g / 12.92 if g <= 0.03928 else ((g + 0.055) / 1.055) ** 2.4
-    b = b / 12.92 if b <= 0.03928 else ((b + 0.055) / 1.055) ** 2.4
-
-    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+# A hex color with an optional leading #
+HEX_COLOR_PATTERN = re.compile(r"#?[0-9a-fA-F]{6}")
 
 # 计算颜色对比度
 def contrast_ratio(l1, l2):
@@ -38,3 +33,327 @@ def hsl_to_rgb(hsl):
 
 def hex_to_rgb(hex_color):
     return tuple(int(hex_color[i:i+2], 16) for i in (1, 3, 5))
+
+# 将 rgb 元组转换成十六进制颜色
+def rgb_to_hex(rgb):
+    return f"#{int(rgb[0]):02x}{int(rgb[1]):02x}{int(rgb[2]):02x}"
+
+# 安全解析十六进制颜色，格式错误时使用默认颜色
+def parse_hex_color(hex_color, default="#FFFFFF", name="color", node="BK_Node"):
+    """Safely parse a hex color string, returns the color with a leading # and its RGB tuple"""
+    hex_color = hex_color.strip()
+    if not hex_color.startswith('#'):
+        hex_color = f"#{hex_color}"
+
+    if not HEX_COLOR_PATTERN.fullmatch(hex_color):
+        print(f"[{node}] ├ WARNING Invalid {name} format: {hex_color}. Using {default} instead.")
+        hex_color = default
+
+    return hex_color, hex_to_rgb(hex_color)
+
+# 解析逗号分隔的或列表形式的多个十六进制颜色
+def parse_hex_palette(hex_colors, default="#FFFFFF", name="color", node="BK_Node"):
+    """
+    Parse a comma-separated string or a list of hex colors at once.
+    Returns the colors with a leading # and an (N, 3) uint8 array.
+    An empty input gives the default color, like parse_hex_color.
+    """
+    if isinstance(hex_colors, str):
+        hex_colors = hex_colors.split(",")
+    colors = [color.strip() for color in hex_colors if color.strip()] or [""]
+
+    parsed = []
+    for color in colors:
+        if not color.startswith('#'):
+            color = f"#{color}"
+        if not HEX_COLOR_PATTERN.fullmatch(color):
+            print(f"[{node}] ├ WARNING Invalid {name} format: {color}. Using {default} instead.")
+            color = default
+        parsed.append(color)
+
+    rgb = np.frombuffer(bytes.fromhex("".join(color[1:] for color in parsed)), dtype=np.uint8)
+    return parsed, rgb.reshape(-1, 3).copy()
+
+# 将 (N, 3) 的 rgb 数组转换成十六进制颜色列表
+def rgb_to_hex_array(rgb):
+    """Vectorised rgb_to_hex for an (N, 3) array of 0-255 values (numpy or torch)"""
+    if isinstance(rgb, torch.Tensor):
+        rgb = rgb.detach().cpu().numpy()
+    digits = np.clip(np.asarray(rgb), 0, 255).astype(np.uint8).reshape(-1, 3).tobytes().hex()
+    return [f"#{digits[i:i + 6]}" for i in range(0, len(digits), 6)]
+
+
+class Palette:
+    """
+    Colors passed between nodes as the PALETTE type: an (N, 3) uint8 RGB array plus
+    (N,) weights summing to one, such as the pixel share of each extracted color.
+    Nodes read it directly instead of formatting and re-parsing hex strings.
+    """
+
+    def __init__(self, rgb, weights=None):
+        self.rgb = np.asarray(rgb, dtype=np.uint8).reshape(-1, 3)
+        weights = np.ones(len(self.rgb)) if weights is None else np.asarray(weights, dtype=np.float64).reshape(-1)
+        total = weights.sum()
+        # Equal weights when none are known
+        self.weights = weights / total if total > 0 else np.full(len(self.rgb), 1.0 / max(1, len(self.rgb)))
+
+    @classmethod
+    def from_hex(cls, hex_colors, default="#FFFFFF", name="color", node="BK_Node"):
+        """Palette of a comma-separated string or a list of hex colors, with equal weights"""
+        _, rgb = parse_hex_palette(hex_colors, default=default, name=name, node=node)
+        return cls(rgb)
+
+    @classmethod
+    def concatenate(cls, palettes):
+        """One palette holding the colors of several, each palette weighing the same"""
+        palettes = [palette for palette in palettes if len(palette)]
+        if not palettes:
+            return cls(np.zeros((0, 3)))
+        return cls(np.concatenate([palette.rgb for palette in palettes]),
+                   np.concatenate([palette.weights / len(palettes) for palette in palettes]))
+
+    def select(self, index):
+        """Palette of the colors at index (an integer array or boolean mask), weights renormalised"""
+        return Palette(self.rgb[index], self.weights[index])
+
+    def to_hex(self):
+        return rgb_to_hex_array(self.rgb)
+
+    def __len__(self):
+        return len(self.rgb)
+
+    def __str__(self):
+        return ", ".join(self.to_hex())
+
+# 读取 PALETTE 输入，未连接时解析十六进制字符串输入
+def read_palette(palette, hex_colors, default="#FFFFFF", name="color", node="BK_Node"):
+    """
+    Hex colors and (N, 3) uint8 RGB of a node's palette: the PALETTE input when it is
+    connected and not empty, otherwise the parsed hex string input
+    """
+    if palette is not None and len(palette):
+        return palette.to_hex(), palette.rgb
+    return parse_hex_palette(hex_colors, default=default, name=name, node=node)
+
+
+# 将输入统一为同一后端（numpy 或 torch）的浮点数组并广播
+def float_arrays(*values):
+    """
+    Broadcast values to float arrays of one backend: torch when any value is a
+    tensor (on its device), numpy float64 otherwise. Returns (module, arrays).
+    """
+    tensors = [value for value in values if isinstance(value, torch.Tensor)]
+    if tensors:
+        reference = tensors[0]
+        dtype = reference.dtype if reference.is_floating_point() else torch.float32
+        arrays = [torch.as_tensor(value, dtype=dtype, device=reference.device) for value in values]
+        return torch, torch.broadcast_tensors(*arrays)
+    return np, np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in values])
+
+# 按扇区索引在多个数组中选值，numpy 和 torch 通用
+def select_by_index(xp, index, options):
+    result = options[-1]
+    for i in range(len(options) - 2, -1, -1):
+        result = xp.where(index == i, options[i], result)
+    return result
+
+# 向量化的 sRGB 转线性光
+def srgb_to_linear(values):
+    """Linearise sRGB channel values in [0, 1] (numpy or torch), as relative_luminance does"""
+    xp, (values,) = float_arrays(values)
+    return xp.where(values <= 0.03928, values / 12.92, ((values.clip(0.0) + 0.055) / 1.055) ** 2.4)
+
+# Linear light of every 8-bit sRGB channel value
+SRGB_LINEAR_LUT = srgb_to_linear(np.arange(256) / 255.0)
+SRGB_LINEAR_LUT_TENSOR = torch.from_numpy(SRGB_LINEAR_LUT.astype(np.float32))
+
+# Number of memoised 24-bit colors for relative_luminance
+LUMINANCE_CACHE_SIZE = 1 << 16
+
+# 计算颜色亮度，8 位通道值查表，结果按颜色缓存
+@lru_cache(maxsize=LUMINANCE_CACHE_SIZE)
+def relative_luminance(r, g, b):
+    channels = (r, g, b)
+    if all(isinstance(c, (int, np.integer)) and 0 <= c <= 255 for c in channels):
+        r, g, b = (SRGB_LINEAR_LUT[c] for c in channels)
+    else:
+        r, g, b = srgb_to_linear(np.array(channels) / 255.0)
+
+    return float(0.2126 * r + 0.7152 * g + 0.0722 * b)
+
+# 向量化的颜色亮度，输入 (..., 3) 数组，scale 为通道最大值
+def relative_luminance_array(rgb, scale=255.0):
+    """
+    Vectorised relative_luminance for N colors or whole images, returns an (...,) array.
+    Integer 0-255 input (lists of RGB tuples, uint8 arrays or tensors) is looked up in
+    SRGB_LINEAR_LUT instead of computing the power curve.
+    """
+    if isinstance(rgb, torch.Tensor):
+        if not rgb.is_floating_point() and scale == 255.0:
+            index = rgb.reshape(-1).to(torch.int32).clamp_(0, 255)
+            linear = SRGB_LINEAR_LUT_TENSOR.to(rgb.device).index_select(0, index).view(rgb.shape)
+        else:
+            linear = srgb_to_linear(rgb / scale)
+    else:
+        rgb = np.asarray(rgb)
+        if np.issubdtype(rgb.dtype, np.integer) and scale == 255.0:
+            linear = SRGB_LINEAR_LUT[np.clip(rgb, 0, 255)]
+        else:
+            linear = srgb_to_linear(rgb / scale)
+    return 0.2126 * linear[..., 0] + 0.7152 * linear[..., 1] + 0.0722 * linear[..., 2]
+
+# 图像像素的亮度，量化为 8 位后查表
+def image_luminance(pixels):
+    """Relative luminance of float [0, 1] pixels (..., C >= 3), rounded to 8 bits to use SRGB_LINEAR_LUT"""
+    rgb = (pixels[..., :3] * 255.0).round_().clamp_(0, 255).to(torch.uint8)
+    return relative_luminance_array(rgb)
+
+# 向量化的颜色对比度，两个亮度数组的顺序不限
+def contrast_ratio_array(l1, l2):
+    """Vectorised contrast_ratio, broadcasting the two luminance arrays"""
+    xp, (l1, l2) = float_arrays(l1, l2)
+    return (xp.maximum(l1, l2) + 0.05) / (xp.minimum(l1, l2) + 0.05)
+
+# 向量化的 rgb 转 hsv，输入 (..., 3) 数组，返回 h, s, v 数组
+def rgb_to_hsv_array(rgb, scale=255.0):
+    """Vectorised colorsys.rgb_to_hsv, scale is the channel maximum (255 for colors, 1 for images)"""
+    xp, (rgb,) = float_arrays(rgb)
+    rgb = rgb / scale
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = xp.maximum(xp.maximum(r, g), b)
+    minc = xp.minimum(xp.minimum(r, g), b)
+    rangec = maxc - minc
+    gray = rangec == 0
+
+    # Gray pixels divide by one, their hue and saturation are forced to zero below
+    safe_range = xp.where(gray, 1.0, rangec)
+    s = xp.where(gray, 0.0, rangec / xp.where(maxc == 0, 1.0, maxc))
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+
+    # Same channel priority as colorsys: red, then green, then blue
+    h = xp.where(r == maxc, bc - gc, xp.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = xp.where(gray, 0.0, (h / 6.0) % 1.0)
+    return h, s, maxc
+
+# 向量化的 hsv 转 rgb，输入为可广播的数组，取值 0-1，返回 0-1 浮点
+def hsv_to_rgb_float_array(h, s, v):
+    """Vectorised colorsys.hsv_to_rgb, returns an (..., 3) float array in [0, 1]"""
+    xp, (h, s, v) = float_arrays(h, s, v)
+    sector = xp.floor(h * 6.0)
+    f = h * 6.0 - sector
+    sector = sector % 6
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+
+    r = select_by_index(xp, sector, [v, q, p, p, t, v])
+    g = select_by_index(xp, sector, [t, v, v, q, p, p])
+    b = select_by_index(xp, sector, [p, p, t, v, v, q])
+    return xp.stack([r, g, b], -1)
+
+# 向量化的 hsv 转 rgb，返回 0-255 整数
+def hsv_to_rgb_array(h, s, v):
+    """Vectorised colorsys.hsv_to_rgb, returns an (..., 3) uint8 array truncated like int()"""
+    rgb = hsv_to_rgb_float_array(h, s, v) * 255.0
+    return rgb.to(torch.uint8) if isinstance(rgb, torch.Tensor) else rgb.astype(np.uint8)
+
+# 向量化的 rgb 转 hsl，返回 h, s, l 数组（与 rgb_to_hsl 顺序一致）
+def rgb_to_hsl_array(rgb, scale=255.0):
+    """Vectorised rgb_to_hsl (colorsys.rgb_to_hls), scale is the channel maximum"""
+    xp, (rgb,) = float_arrays(rgb)
+    rgb = rgb / scale
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = xp.maximum(xp.maximum(r, g), b)
+    minc = xp.minimum(xp.minimum(r, g), b)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0
+    gray = rangec == 0
+
+    safe_range = xp.where(gray, 1.0, rangec)
+    s = xp.where(gray, 0.0, rangec / xp.where(gray, 1.0, xp.where(l <= 0.5, sumc, 2.0 - maxc - minc)))
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+
+    h = xp.where(r == maxc, bc - gc, xp.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = xp.where(gray, 0.0, (h / 6.0) % 1.0)
+    return h, s, l
+
+# 向量化的 hsl 转 rgb，返回 0-1 浮点
+def hsl_to_rgb_float_array(h, s, l):
+    """Vectorised colorsys.hls_to_rgb, returns an (..., 3) float array in [0, 1]"""
+    xp, (h, s, l) = float_arrays(h, s, l)
+    m2 = xp.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+
+    def channel(hue):
+        hue = hue % 1.0
+        rising = m1 + (m2 - m1) * hue * 6.0
+        falling = m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0
+        return xp.where(hue < 1.0 / 6.0, rising,
+                        xp.where(hue < 0.5, m2, xp.where(hue < 2.0 / 3.0, falling, m1)))
+
+    rgb = xp.stack([channel(h + 1.0 / 3.0), channel(h), channel(h - 1.0 / 3.0)], -1)
+    return xp.where((s == 0)[..., None], l[..., None], rgb)
+
+# 向量化的 hsl 转 rgb，返回 0-255 整数
+def hsl_to_rgb_array(h, s, l):
+    """Vectorised hsl_to_rgb, returns an (..., 3) uint8 array truncated like hsl_to_rgb"""
+    rgb = hsl_to_rgb_float_array(h, s, l) * 255.0
+    return rgb.to(torch.uint8) if isinstance(rgb, torch.Tensor) else rgb.astype(np.uint8)
+
+# Bisection steps of the contrast lightness search (resolution 2^-16 of the lightness range)
+CONTRAST_SEARCH_STEPS = 16
+
+# WCAG 文本对比度阈值
+def wcag_threshold(level):
+    return 7.0 if level == "AAA" else 4.5
+
+# 在保持色相和饱和度的前提下，二分查找满足对比度阈值的最近亮度
+def search_contrast_lightness(bg_luminance, text_rgb, threshold, steps=CONTRAST_SEARCH_STEPS):
+    """
+    For each of N text colors, bisect the HSL lightness towards white and towards
+    black (hue and saturation kept) for the nearest 8-bit color whose contrast
+    against the background luminance reaches threshold. All 2N searches run
+    together, and the predicate is evaluated on the rounded 8-bit color so the
+    returned colors pass exactly.
+
+    Returns rgb (N, 2, 3) uint8, lightness (N, 2), contrast (N, 2) and passes (N, 2),
+    where index 0 of the second axis is the lighter search and 1 the darker one.
+    """
+    text_rgb = np.asarray(text_rgb, dtype=np.uint8).reshape(-1, 3)
+    h, s, l = (np.repeat(channel[:, None], 2, axis=1) for channel in rgb_to_hsl_array(text_rgb))
+    lighter = np.zeros_like(l, dtype=bool)
+    lighter[:, 0] = True
+
+    # Text luminance bounds: at least light_target above the background, or at most dark_target below it
+    light_target = threshold * (bg_luminance + 0.05) - 0.05
+    dark_target = (bg_luminance + 0.05) / threshold - 0.05
+
+    def evaluate(lightness):
+        rgb = np.round(hsl_to_rgb_float_array(h, s, lightness) * 255.0).astype(np.uint8)
+        luminance = relative_luminance_array(rgb)
+        return rgb, np.where(lighter, luminance >= light_target, luminance <= dark_target)
+
+    # The predicate is monotone in lightness: it holds above the answer when lightening, below it when darkening
+    lo = np.where(lighter, l, 0.0)
+    hi = np.where(lighter, 1.0, l)
+    for _ in range(steps):
+        mid = (lo + hi) / 2.0
+        _, ok = evaluate(mid)
+        move_hi = ok == lighter
+        hi = np.where(move_hi, mid, hi)
+        lo = np.where(move_hi, lo, mid)
+
+    # Text colors that already pass are kept unchanged
+    original = relative_luminance_array(text_rgb)[:, None]
+    already = np.where(lighter, original >= light_target, original <= dark_target)
+    lightness = np.where(already, l, np.where(lighter, hi, lo))
+    rgb, _ = evaluate(lightness)
+    rgb = np.where(already[..., None], text_rgb[:, None, :], rgb)
+
+    contrast = contrast_ratio_array(relative_luminance_array(rgb), bg_luminance)
+    return rgb, lightness, contrast, contrast >= threshold
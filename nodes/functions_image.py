@@ -1,11 +1,178 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
 import torch
 import numpy as np
 from PIL import Image
 
+# Number of generated images kept by an image cache
+IMAGE_CACHE_SIZE = 16
+
+# Total tensor memory kept by an image cache, in megabytes
+IMAGE_CACHE_MB = 1024
+
+# Elements scaled per chunk by the tensor to uint8 bridge, bounding its float buffer
+BRIDGE_CHUNK_ELEMENTS = 1 << 22
+
+# PIL modes kept as they are by pil2tensor_batch, other modes are converted to RGB or RGBA
+BRIDGE_MODES = ("L", "RGB", "RGBA")
+
 # Tensor to PIL
 def tensor2pil(image):
-    return Image.fromarray(np.clip(255. * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+    return Image.fromarray(tensor_to_uint8(image).squeeze())
 
 # Convert PIL to Tensor
 def pil2tensor(image):
-    return torch.from_numpy(np.array(image).astype(np.float32) / 255.0).unsqueeze(0) 
\ No newline at end of file
+    return pil2tensor_batch([image])
+
+# 将 IMAGE / MASK 张量一次性转换为 uint8 数组，分块复用同一块浮点缓冲区
+def tensor_to_uint8(images, out=None):
+    """
+    uint8 numpy array of the same shape as a float [0, 1] tensor, values scaled, clipped
+    and truncated like astype(np.uint8). The tensor is scaled chunk by chunk in one reused
+    float buffer on its own device, and written straight into out (allocated when None).
+    """
+    flat = images.detach().reshape(-1)
+    if out is None:
+        out = np.empty(tuple(images.shape), dtype=np.uint8)
+    target = torch.from_numpy(out).view(-1)
+
+    dtype = flat.dtype if flat.is_floating_point() else torch.float32
+    buffer = torch.empty(min(flat.numel(), BRIDGE_CHUNK_ELEMENTS), dtype=dtype, device=flat.device)
+    for start in range(0, flat.numel(), BRIDGE_CHUNK_ELEMENTS):
+        chunk = buffer[:min(BRIDGE_CHUNK_ELEMENTS, flat.numel() - start)]
+        torch.mul(flat[start:start + chunk.numel()], 255.0, out=chunk).clamp_(0, 255)
+        target[start:start + chunk.numel()].copy_(chunk)
+    return out
+
+# 将 IMAGE 或 MASK 批次中的每一帧转换为 PIL 图像
+def tensor2pil_batch(images):
+    """
+    PIL images of every frame of an IMAGE (B, H, W, C) or MASK (B, H, W) batch, or of
+    a single (H, W, C) image or (H, W) mask. The batch is converted to uint8 in one pass;
+    RGBA and single channel ("L") frames are views of that buffer, RGB frames are copied by PIL.
+    """
+    if images.dim() == 2 or (images.dim() == 3 and images.shape[-1] not in (1, 3, 4)):
+        images = images.unsqueeze(-1)
+    if images.dim() == 3:
+        images = images.unsqueeze(0)
+    pixels = tensor_to_uint8(images)
+    if pixels.shape[-1] == 1:
+        pixels = pixels[..., 0]
+    return [Image.fromarray(frame) for frame in pixels]
+
+# 将多张相同尺寸的 PIL 图像写入一个预分配的 IMAGE 或 MASK 批次
+def pil2tensor_batch(images, out=None):
+    """
+    (B, H, W, C) float32 IMAGE batch of same-size PIL images, or a (B, H, W) MASK batch
+    when every image is "L". Modes are unified to RGBA when any image has alpha, else RGB.
+    Each frame is copied once from its uint8 pixels into the preallocated batch (or a
+    float32 CPU out tensor), then the whole batch is scaled in place.
+    """
+    if not images:
+        raise ValueError("[BK_Node] pil2tensor_batch needs at least one image")
+    if any(image.size != images[0].size for image in images):
+        raise ValueError(f"[BK_Node] pil2tensor_batch needs same-size images, got {[image.size for image in images]}")
+
+    modes = {image.mode for image in images}
+    if modes == {"L"}:
+        mode = "L"
+    elif len(modes) == 1 and images[0].mode in BRIDGE_MODES:
+        mode = images[0].mode
+    elif any("A" in image.mode or "transparency" in image.info for image in images):
+        mode = "RGBA"
+    else:
+        mode = "RGB"
+
+    width, height = images[0].size
+    shape = (len(images), height, width) if mode == "L" else (len(images), height, width, len(mode))
+    if out is None:
+        out = torch.empty(shape, dtype=torch.float32)
+    for frame, image in zip(out.numpy(), images):
+        np.copyto(frame, np.asarray(image if image.mode == mode else image.convert(mode)))
+    return out.div_(255.0)
+
+# 构建积分图（summed-area table），任意矩形区域求和为 O(1)
+def summed_area_table(values):
+    """(H + 1, W + 1, ...) float64 table of an (H, W, ...) tensor, zero padded at the top and left"""
+    height, width = values.shape[:2]
+    table = torch.zeros((height + 1, width + 1, *values.shape[2:]), dtype=torch.float64, device=values.device)
+    table[1:, 1:] = values.to(torch.float64).cumsum(0).cumsum(1)
+    return table
+
+# 用积分图计算多个矩形区域的均值
+def region_means(table, boxes):
+    """Means of (R, 4) (x0, y0, x1, y1) boxes, end exclusive, from a summed-area table"""
+    boxes = torch.as_tensor(boxes, dtype=torch.long, device=table.device)
+    x0, y0, x1, y1 = boxes.unbind(-1)
+    sums = table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+    area = ((x1 - x0) * (y1 - y0)).to(torch.float64)
+    return sums / area.reshape(-1, *([1] * (sums.dim() - 1)))
+
+# 解析 "x, y, width, height" 形式的矩形区域，多个区域以分号或换行分隔
+def parse_regions(regions, width, height, node="BK_Node"):
+    """
+    Parse pixel rectangles "x, y, width, height" separated by ';' or new lines into
+    (R, 4) (x0, y0, x1, y1) boxes clipped to the image. Empty input covers the whole image.
+    """
+    boxes = []
+    for entry in regions.replace("\n", ";").split(";"):
+        if not entry.strip():
+            continue
+        try:
+            x, y, w, h = (int(round(float(value))) for value in entry.split(","))
+        except ValueError:
+            print(f"[{node}] ├ WARNING Invalid region: {entry.strip()}. Expected x, y, width, height.")
+            continue
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            print(f"[{node}] ├ WARNING Region {entry.strip()} is empty inside the {width}x{height} image.")
+            continue
+        boxes.append((x0, y0, x1, y1))
+    return boxes or [(0, 0, width, height)]
+
+
+class ImageCache:
+    """
+    Size-bounded LRU cache of generated image tensors, such as gradients and constant images.
+    Bounded by both the number of entries and their total memory; keys are built from
+    every parameter that affects the image.
+    """
+
+    def __init__(self, max_entries: int = IMAGE_CACHE_SIZE, max_mb: float = IMAGE_CACHE_MB):
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * (1 << 20))
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[torch.Tensor]:
+        """Return the cached image for key and mark it as recently used"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, image: torch.Tensor) -> None:
+        """Store an image, evicting the least recently used entries beyond the size limits"""
+        size = image.element_size() * image.nelement()
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries[key].element_size() * self._entries[key].nelement()
+            # An image larger than the whole cache is not kept
+            if size > self.max_bytes:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.element_size() * evicted.nelement()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,490 @@
+"""
+Palette extraction helpers shared by the color nodes.
+Every engine returns ``(centers, counts)``: cluster centers as floats in [0, 1]
+and the number of pixels assigned to each center. Engines accept an optional
+``init`` array of starting centers; the quantizer engines ignore it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Tuple, Optional, Iterator, Hashable, Union
+import numpy as np
+from numpy import ndarray
+import torch
+from PIL import Image
+
+# Bits per channel used by the histogram engine (64 levels, 262144 bins)
+HISTOGRAM_BITS = 6
+
+# Default memory ceiling of the streaming engine, in megabytes
+STREAMING_MEMORY_MB = 256
+
+# Number of fitted palettes kept by the palette cache
+PALETTE_CACHE_SIZE = 64
+
+# Pixels per distance block of the torch engine (block x num_colors float32 distances)
+TORCH_CHUNK_PIXELS = 1 << 18
+
+# Pixels sampled to choose between the initializations of the torch engine
+TORCH_INIT_SAMPLES = 20000
+
+# Pixels sampled by the automatic cluster-count search
+AUTO_SAMPLES = 10000
+
+# Smallest relative inertia drop that still justifies one more cluster
+AUTO_MIN_GAIN = 0.15
+
+# RMS pixel-to-palette distance below which the palette is considered good enough (~13/255)
+AUTO_MIN_RMS = 0.05
+
+
+# 像素不多于聚类数时，直接返回去重后的颜色及其数量
+def unique_palette(pixels: ndarray, sample_weight: Optional[ndarray] = None) -> Tuple[ndarray, ndarray]:
+    """Distinct colors of an (N, 3) pixel array and their (weighted) pixel counts"""
+    colors, inverse = np.unique(pixels, axis=0, return_inverse=True)
+    return colors, np.bincount(inverse.reshape(-1), weights=sample_weight, minlength=len(colors))
+
+
+# 将 KMeans 聚类结果整理成 (centers, counts)
+def kmeans_palette(pixels: ndarray,
+                   num_colors: int,
+                   max_iterations: int,
+                   n_init: int,
+                   sample_weight: Optional[ndarray] = None,
+                   init: Optional[ndarray] = None) -> Tuple[ndarray, ndarray]:
+    """Cluster an (N, 3) pixel array with Lloyd K-means, optionally weighting each sample"""
+    # Alpha or mask pruning can leave fewer pixels than clusters: every pixel is a palette entry
+    if len(pixels) <= num_colors:
+        return unique_palette(pixels, sample_weight)
+
+    # Imported lazily, scikit-learn is only needed by the engines that use it
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(
+        n_clusters=num_colors,
+        algorithm="lloyd",
+        init="k-means++" if init is None else init,
+        max_iter=max_iterations,
+        n_init=n_init if init is None else 1,
+        random_state=42  # For reproducibility
+    )
+    kmeans.fit(pixels, sample_weight=sample_weight)
+    counts = np.bincount(kmeans.labels_, weights=sample_weight, minlength=num_colors)
+    return kmeans.cluster_centers_, counts
+
+
+# 统计 3D 颜色直方图，返回每个非空格子的平均颜色与像素数
+def color_histogram(pixels: ndarray, bits: int = HISTOGRAM_BITS) -> Tuple[ndarray, ndarray]:
+    """Bin an (N, 3) pixel array into a 3D histogram with ``bits`` bits per channel"""
+    levels = 1 << bits
+    quantized = np.clip((pixels * levels).astype(np.int32), 0, levels - 1)
+    codes = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+
+    counts = np.bincount(codes, minlength=levels ** 3)
+    occupied = np.flatnonzero(counts)
+    counts = counts[occupied]
+
+    # Use the mean color of each bin rather than its center to keep full precision
+    colors = np.empty((len(occupied), 3), dtype=np.float64)
+    for channel in range(3):
+        sums = np.bincount(codes, weights=pixels[:, channel], minlength=levels ** 3)
+        colors[:, channel] = sums[occupied] / counts
+
+    return colors, counts
+
+
+# 先做直方图预分桶，再对非空格子做加权 KMeans
+def histogram_palette(pixels: ndarray,
+                      num_colors: int,
+                      max_iterations: int,
+                      n_init: int,
+                      init: Optional[ndarray] = None) -> Tuple[ndarray, ndarray]:
+    """Cluster the occupied bins of a color histogram, weighted by their pixel counts"""
+    colors, counts = color_histogram(pixels)
+
+    # Fewer distinct colors than clusters: every bin is already a palette entry
+    if len(colors) <= num_colors:
+        return colors, counts
+
+    return kmeans_palette(colors, num_colors, max_iterations, n_init, sample_weight=counts, init=init)
+
+
+# 按像素数量从多到少排序
+def sort_palette(centers: ndarray, counts: ndarray) -> Tuple[ndarray, ndarray]:
+    """Sort cluster centers by cluster size (most frequent first)"""
+    sorted_indices = np.argsort(-counts, kind="stable")
+    return centers[sorted_indices], counts[sorted_indices]
+
+
+# 按参考调色板的顺序重新排列，保持跨帧的颜色索引稳定
+def match_palette(centers: ndarray, counts: ndarray, reference: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    Reorder centers so each one takes the index of its closest reference center.
+    Centers left unmatched (when there are more centers than references) are
+    appended after the matched ones, most frequent first.
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    distances = ((centers[:, None, :] - reference[None, :, :]) ** 2).sum(axis=-1)
+    rows, cols = linear_sum_assignment(distances)
+    matched = rows[np.argsort(cols)]
+    unmatched = np.setdiff1d(np.arange(len(centers)), rows)
+    unmatched = unmatched[np.argsort(-counts[unmatched], kind="stable")]
+    order = np.concatenate([matched, unmatched])
+    return centers[order], counts[order]
+
+
+# 按内存上限估算每个分块可容纳的像素数
+def streaming_chunk_size(num_colors: int, max_memory_mb: int = STREAMING_MEMORY_MB) -> int:
+    """Number of pixels per chunk so one chunk and its distance matrix fit in ``max_memory_mb``"""
+    # float32 pixel copy + float32 distances to every center, doubled for sklearn temporaries
+    bytes_per_pixel = 2 * 4 * (3 + num_colors)
+    return max(num_colors, int(max_memory_mb * 1024 * 1024) // bytes_per_pixel)
+
+
+# 按固定大小分块读取像素，每次只复制一个分块
+def iter_pixel_chunks(pixels: torch.Tensor,
+                      chunk_size: int,
+                      keep: Optional[torch.Tensor] = None) -> Iterator[ndarray]:
+    """
+    Yield contiguous float32 (n, 3) numpy chunks from an (N, C) pixel tensor view.
+    Pixels whose entry in the optional (N,) boolean keep tensor is False are skipped.
+    """
+    for start in range(0, pixels.shape[0], chunk_size):
+        chunk = pixels[start:start + chunk_size, :3]
+        if keep is not None:
+            chunk = chunk[keep[start:start + chunk_size]]
+            if chunk.shape[0] == 0:
+                continue
+        yield np.ascontiguousarray(chunk.cpu().numpy(), dtype=np.float32)
+
+
+# 流式 MiniBatch KMeans，峰值内存与输入大小无关
+def streaming_palette(pixels: torch.Tensor,
+                      num_colors: int,
+                      max_iterations: int,
+                      n_init: int,
+                      chunk_size: Optional[int] = None,
+                      init: Optional[ndarray] = None,
+                      keep: Optional[torch.Tensor] = None) -> Tuple[ndarray, ndarray]:
+    """Fit an incremental K-means over fixed-size chunks of an (N, C) pixel tensor, skipping pixels not in keep"""
+    from sklearn.cluster import MiniBatchKMeans
+
+    chunk_size = chunk_size or streaming_chunk_size(num_colors)
+
+    # Fewer visible pixels than clusters: they are few enough to read at once
+    visible = pixels.shape[0] if keep is None else int(torch.count_nonzero(keep))
+    if visible <= num_colors:
+        return unique_palette(np.concatenate(list(iter_pixel_chunks(pixels, chunk_size, keep))))
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=num_colors,
+        init="k-means++" if init is None else init,
+        batch_size=min(chunk_size, 4096),
+        n_init=n_init if init is None else 1,
+        random_state=42  # For reproducibility
+    )
+
+    # Every pass feeds each chunk once; more accuracy means more passes
+    passes = max(1, min(10, max_iterations // 100))
+    for _ in range(passes):
+        for chunk in iter_pixel_chunks(pixels, chunk_size, keep):
+            kmeans.partial_fit(chunk)
+
+    # Count cluster sizes with a final labelling pass over the same chunks
+    counts = np.zeros(num_colors, dtype=np.int64)
+    for chunk in iter_pixel_chunks(pixels, chunk_size, keep):
+        counts += np.bincount(kmeans.predict(chunk), minlength=num_colors)
+
+    return kmeans.cluster_centers_, counts
+
+
+# 在张量上分块计算最近中心，返回标签与到中心的平方距离
+def torch_assign(pixels: torch.Tensor,
+                 centers: torch.Tensor,
+                 chunk_size: int = TORCH_CHUNK_PIXELS) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Label every pixel with its closest center, computing distances block by block"""
+    labels = torch.empty(pixels.shape[0], dtype=torch.long, device=pixels.device)
+    distances = torch.empty(pixels.shape[0], dtype=torch.float32, device=pixels.device)
+    center_norms = (centers * centers).sum(dim=1)
+    for start in range(0, pixels.shape[0], chunk_size):
+        block = pixels[start:start + chunk_size]
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, computed as one matrix product per block
+        block_distances = torch.addmm(center_norms, block, centers.T, alpha=-2.0)
+        block_min, labels[start:start + chunk_size] = block_distances.min(dim=1)
+        distances[start:start + chunk_size] = block_min + (block * block).sum(dim=1)
+    return labels, distances.clamp_(min=0)
+
+
+# 在张量上执行 Lloyd 迭代
+def torch_lloyd(pixels: torch.Tensor,
+                centers: torch.Tensor,
+                max_iterations: int,
+                tolerance: float = 1e-8) -> Tuple[torch.Tensor, torch.Tensor, float]:
+    """Run Lloyd iterations from the given centers, returning (centers, labels, inertia)"""
+    num_colors = centers.shape[0]
+    for _ in range(max_iterations):
+        labels, _ = torch_assign(pixels, centers)
+        counts = torch.bincount(labels, minlength=num_colors).unsqueeze(1)
+        sums = torch.zeros_like(centers).index_add_(0, labels, pixels)
+        # Empty clusters keep their previous center
+        updated = torch.where(counts > 0, sums / counts.clamp(min=1), centers)
+        shift = float(((updated - centers) ** 2).sum())
+        centers = updated
+        if shift <= tolerance:
+            break
+
+    labels, distances = torch_assign(pixels, centers)
+    return centers, labels, float(distances.sum())
+
+
+# 从像素视图中随机抽样，内存只与样本数有关，而与像素总数无关
+def sample_pixels(pixels: torch.Tensor,
+                  num_samples: int,
+                  generator: torch.Generator,
+                  keep: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    Up to num_samples random RGB rows, drawn with replacement, of an (N, C) pixel view
+    as float32. Only the sampled rows are copied. With a keep mask, visible rows are
+    drawn by rejection sampling, or from the nonzero indices of keep when few pixels
+    are visible, whichever needs fewer indices.
+    """
+    total = pixels.shape[0]
+    if keep is None:
+        if total <= num_samples:
+            return pixels[:, :3].float()
+        index = torch.randint(total, (num_samples,), generator=generator)
+    else:
+        keep = keep.reshape(-1)
+        # count_nonzero avoids the int64 copy of keep that sum() makes
+        count = int(torch.count_nonzero(keep))
+        if count <= num_samples:
+            return pixels[keep, :3].float()
+
+        if count * count <= num_samples * total:
+            # Few visible pixels: their indices are cheaper than the rejected draws
+            visible = torch.nonzero(keep).squeeze(1).cpu()
+            index = visible[torch.randint(count, (num_samples,), generator=generator)]
+        else:
+            draws, found = [], 0
+            while found < num_samples:
+                # Draw a little more than the expected number of rejections
+                size = int((num_samples - found) * total / count * 1.2) + 64
+                candidates = torch.randint(total, (size,), generator=generator)
+                candidates = candidates[keep[candidates.to(keep.device)].cpu()]
+                draws.append(candidates)
+                found += len(candidates)
+            index = torch.cat(draws)[:num_samples]
+
+    return pixels[index.to(pixels.device), :3].float()
+
+
+# k-means++ 初始化
+def torch_kmeans_plus_plus(pixels: torch.Tensor, num_colors: int, generator: torch.Generator) -> torch.Tensor:
+    """Pick initial centers with k-means++ seeding"""
+    first = torch.randint(pixels.shape[0], (1,), generator=generator, device="cpu")
+    centers = pixels[first.to(pixels.device)]
+    closest = ((pixels - centers[0]) ** 2).sum(dim=1)
+    for _ in range(1, num_colors):
+        if float(closest.sum()) <= 0:
+            # Fewer distinct colors than clusters, repeat an existing center
+            index = torch.randint(pixels.shape[0], (1,), generator=generator, device="cpu")
+        else:
+            index = torch.multinomial(closest.cpu(), 1, generator=generator)
+        center = pixels[index.to(pixels.device)]
+        centers = torch.cat([centers, center])
+        closest = torch.minimum(closest, ((pixels - center) ** 2).sum(dim=1))
+    return centers
+
+
+# 纯 torch 实现的 KMeans，直接在 IMAGE 张量上计算
+def torch_kmeans_palette(pixels: torch.Tensor,
+                         num_colors: int,
+                         max_iterations: int,
+                         n_init: int,
+                         init: Optional[ndarray] = None,
+                         keep: Optional[torch.Tensor] = None) -> Tuple[ndarray, ndarray]:
+    """
+    Lloyd K-means on an (N, C) pixel tensor view in float32, without numpy or sklearn copies.
+    The n_init k-means++ initializations are compared on a pixel subsample and only the
+    best one is refined on all pixels.
+    """
+    pixels = pixels[:, :3]
+    if keep is not None:
+        pixels = pixels[keep]
+    pixels = pixels.float()
+
+    if init is not None:
+        centers = torch.as_tensor(init, dtype=torch.float32, device=pixels.device)
+    else:
+        generator = torch.Generator().manual_seed(42)  # For reproducibility
+        sample = sample_pixels(pixels, TORCH_INIT_SAMPLES, generator)
+
+        best_inertia = None
+        for _ in range(n_init):
+            candidate = torch_kmeans_plus_plus(sample, num_colors, generator)
+            candidate, _, inertia = torch_lloyd(sample, candidate, max_iterations)
+            if best_inertia is None or inertia < best_inertia:
+                centers, best_inertia = candidate, inertia
+
+    centers, labels, _ = torch_lloyd(pixels, centers, max_iterations)
+    counts = torch.bincount(labels, minlength=num_colors)
+    return centers.cpu().double().numpy(), counts.cpu().numpy()
+
+
+# 在子样本上逐步增加 k，用肘部法则自动选择颜色数量
+def auto_num_colors(pixels: torch.Tensor,
+                    max_colors: int,
+                    max_iterations: int,
+                    keep: Optional[torch.Tensor] = None) -> int:
+    """
+    Pick the number of clusters for an (N, C) pixel tensor view with an elbow criterion.
+    Fits k = 1, 2, ... on a subsample of the kept pixels, seeding every k with the centers
+    of k - 1 plus the worst-fitted pixel, and stops once one more cluster lowers the inertia
+    by less than AUTO_MIN_GAIN or the palette is already within AUTO_MIN_RMS.
+    """
+    generator = torch.Generator().manual_seed(42)  # For reproducibility
+    pixels = sample_pixels(pixels, AUTO_SAMPLES, generator, keep=keep)
+
+    # Refits from a good seed converge quickly, so fewer iterations are needed
+    refit_iterations = max(5, max_iterations // 20)
+
+    centers = pixels.mean(dim=0, keepdim=True)
+    _, distances = torch_assign(pixels, centers)
+    inertia = float(distances.sum())
+
+    min_inertia = AUTO_MIN_RMS ** 2 * pixels.shape[0]
+    for num_colors in range(2, max_colors + 1):
+        if inertia <= min_inertia:
+            return num_colors - 1
+
+        # Seed the new cluster with the pixel farthest from the current centers
+        seed = pixels[int(torch.argmax(distances))].unsqueeze(0)
+        candidate, _, candidate_inertia = torch_lloyd(pixels, torch.cat([centers, seed]), refit_iterations)
+
+        if (inertia - candidate_inertia) / inertia < AUTO_MIN_GAIN:
+            return num_colors - 1
+
+        centers, inertia = candidate, candidate_inertia
+        _, distances = torch_assign(pixels, centers)
+
+    return max_colors
+
+
+# 使用 PIL 的量化器（中位切分 / 快速八叉树）提取调色板
+def quantize_palette(pixels: ndarray, num_colors: int, method: int) -> Tuple[ndarray, ndarray]:
+    """Quantize an (N, 3) pixel array with a PIL quantizer and count each palette entry"""
+    rgb = np.clip(pixels * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    image = Image.fromarray(rgb.reshape(1, -1, 3), "RGB")
+    quantized = image.quantize(colors=num_colors, method=method)
+
+    counts = np.bincount(np.asarray(quantized).reshape(-1), minlength=num_colors)[:num_colors]
+    palette = np.asarray(quantized.getpalette()[:3 * num_colors], dtype=np.float64).reshape(-1, 3)
+    counts = counts[:len(palette)]
+
+    # The quantizer may return fewer colors than requested; drop unused entries
+    used = counts > 0
+    return palette[used] / 255.0, counts[used]
+
+
+def median_cut_palette(pixels: ndarray,
+                       num_colors: int,
+                       max_iterations: int,
+                       n_init: int,
+                       init: Optional[ndarray] = None) -> Tuple[ndarray, ndarray]:
+    """Median-cut quantization, the iteration parameters are not used"""
+    return quantize_palette(pixels, num_colors, Image.Quantize.MEDIANCUT)
+
+
+def fast_octree_palette(pixels: ndarray,
+                        num_colors: int,
+                        max_iterations: int,
+                        n_init: int,
+                        init: Optional[ndarray] = None) -> Tuple[ndarray, ndarray]:
+    """Fast octree quantization, the iteration parameters are not used"""
+    return quantize_palette(pixels, num_colors, Image.Quantize.FASTOCTREE)
+
+
+# 可选的调色板提取引擎
+PALETTE_ENGINES = {
+    "exact": kmeans_palette,
+    "histogram": histogram_palette,
+    "streaming": streaming_palette,
+    "median_cut": median_cut_palette,
+    "fast_octree": fast_octree_palette,
+    "torch": torch_kmeans_palette,
+}
+
+# 按内存上限分块读取像素的引擎
+STREAMING_ENGINES = {"streaming"}
+
+# 直接读取像素张量视图并自行处理 keep 掩码的引擎
+TENSOR_ENGINES = STREAMING_ENGINES | {"torch"}
+
+
+# 限制原生线程池的线程数，避免并行拟合时线程数过度订阅
+@contextmanager
+def native_thread_limits(threads: int, global_pools: bool = True):
+    """
+    Limit the native thread pools used by the engines to threads.
+    OpenMP limits (scikit-learn's K-means) only apply to the calling thread, so every
+    worker enters this around its fit with global_pools=False. The BLAS and torch intra-op
+    pools are process-wide, so the thread starting the workers limits them once.
+    """
+    # Imported lazily like scikit-learn, which ships threadpoolctl
+    from threadpoolctl import threadpool_limits
+
+    previous = torch.get_num_threads()
+    try:
+        if global_pools:
+            torch.set_num_threads(threads)
+        with threadpool_limits(limits=threads, user_api=None if global_pools else "openmp"):
+            yield
+    finally:
+        if global_pools:
+            torch.set_num_threads(previous)
+
+
+# 计算张量内容的快速哈希，用作缓存键
+def tensor_digest(tensor: torch.Tensor) -> str:
+    """Hash the content, shape and dtype of a tensor"""
+    array = tensor.detach().cpu().contiguous().numpy()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{tuple(array.shape)}:{array.dtype}".encode())
+    digest.update(array.reshape(-1).view(np.uint8))
+    return digest.hexdigest()
+
+
+class PaletteCache:
+    """
+    Size-bounded LRU cache of fitted palettes.
+    Values are ``(centers, counts)`` tuples, or the number of colors chosen by
+    auto_num_colors; keys are built from the image digest and every parameter
+    that affects the fit.
+    """
+
+    def __init__(self, max_entries: int = PALETTE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Union[Tuple[ndarray, ndarray], int]]:
+        """Return the cached palette for key and mark it as recently used"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, palette: Union[Tuple[ndarray, ndarray], int]) -> None:
+        """Store a palette, evicting the least recently used entries beyond the size limit"""
+        with self._lock:
+            self._entries[key] = palette
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
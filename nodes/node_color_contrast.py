@@ -1,4 +1,8 @@
-from .functions_color import relative_luminance, contrast_ratio
+import numpy as np
+from .functions_color import (
+    contrast_ratio_array, parse_hex_color, relative_luminance_array, rgb_to_hex, rgb_to_hsl_array,
+    search_contrast_lightness, wcag_threshold,
+)
 
 class BK_ColorContrast:
 
@@ -12,6 +16,7 @@ class BK_ColorContrast:
             "optional": {
                 "light_text_hex_color": ("STRING", { "default": "" }),
                 "dark_text_hex_color": ("STRING", { "default": "" }),
+                "text_mode": (["select", "search"], { "default": "select" }),
             }
         }
 
@@ -20,44 +25,41 @@ class BK_ColorContrast:
     RETURN_NAMES = ("BG_COLOR", "TEXT_COLOR", )
     FUNCTION = "exec"
     OUTPUT_NODE = True
-    DESCRIPTION = "计算颜色对比度，小于阈值返回亮色，大于阈值返回暗色"
+    DESCRIPTION = "计算颜色对比度，小于阈值返回亮色，大于阈值返回暗色；search 模式下在保持色相的前提下查找满足 WCAG 阈值的最近文字颜色"
 
     @staticmethod
-    def parse_hex_color(hex_color, default="#FFFFFF", name="color"):
-        """Safely parse a hex color string to RGB values"""
-        # Ensure proper format with leading #
-        if not hex_color.startswith('#'):
-            hex_color = f"#{hex_color}"
+    def get_luminance_and_contrast(bg_rgb, text_rgbs):
+        """
+        Calculate luminance and contrast ratio between a background color and
+        any number of text colors at once
+        """
+        # Calculate luminance values of the background and every text color together
+        luminance = relative_luminance_array([bg_rgb, *text_rgbs])
+        bg_luminance, text_luminance = float(luminance[0]), luminance[1:]
         
-        # Validate length
-        if len(hex_color) != 7:
-            print(f"[BK_ColorContrast] ├ WARNING Invalid {name} format: {hex_color}. Using {default} instead.")
-            hex_color = default
-            
-        try:
-            # Extract RGB components
-            r = int(hex_color[1:3], 16)
-            g = int(hex_color[3:5], 16)
-            b = int(hex_color[5:7], 16)
-            return hex_color, (r, g, b)
-        except ValueError:
-            print(f"[BK_ColorContrast] ├ WARNING Could not parse {name}: {hex_color}. Using {default} instead.")
-            # Parse the default color instead
-            r = int(default[1:3], 16)
-            g = int(default[3:5], 16)
-            b = int(default[5:7], 16)
-            return default, (r, g, b)
+        # Calculate contrast ratios
+        contrast = contrast_ratio_array(text_luminance, bg_luminance)
+        return bg_luminance, text_luminance, contrast
 
     @staticmethod
-    def get_luminance_and_contrast(bg_rgb, text_rgb):
-        """Calculate luminance and contrast ratio between background and text colors"""
-        # Calculate luminance values
-        bg_luminance = relative_luminance(*bg_rgb)
-        text_luminance = relative_luminance(*text_rgb)
-        
-        # Calculate contrast ratio
-        contrast = contrast_ratio(text_luminance, bg_luminance)
-        return bg_luminance, text_luminance, contrast
+    def search_text_color(bg_luminance, text_rgbs, threshold):
+        """
+        Search the nearest WCAG-compliant color of the same hue for every text color,
+        lighter and darker at once, and return the one needing the smallest lightness change
+        """
+        rgb, lightness, contrast, passes = search_contrast_lightness(bg_luminance, text_rgbs, threshold)
+        _, _, original = rgb_to_hsl_array(text_rgbs)
+        change = np.abs(lightness - original[:, None])
+
+        if passes.any():
+            # Smallest lightness change first, higher contrast on ties
+            candidates = np.flatnonzero(passes)
+            order = np.lexsort((-contrast.ravel()[candidates], change.ravel()[candidates]))
+            best = candidates[order[0]]
+        else:
+            best = int(np.argmax(contrast))
+        index = np.unravel_index(best, contrast.shape)
+        return rgb_to_hex(rgb[index]), float(contrast[index]), bool(passes[index])
 
     def exec(
         self,
@@ -65,10 +67,13 @@ class BK_ColorContrast:
         WCAG_level = "AA",
         light_text_hex_color = "",
         dark_text_hex_color = "",
+        text_mode = "select",
     ):
         """
         Calculate contrast ratio between background and text colors.
         Returns appropriate text color based on WCAG accessibility standards.
+        In search mode the light and dark text colors are only starting points: the
+        nearest color of the same hue that meets the WCAG level is returned.
         """
         # Set default values if not provided
         light_text_hex_color = light_text_hex_color or "#FFFFFF"
@@ -78,27 +83,32 @@ class BK_ColorContrast:
         print(f"[BK_ColorContrast] ○ INPUT Background color: {bg_hex_color}")
         
         # Parse colors with validation
-        bg_hex_color, bg_rgb = self.parse_hex_color(bg_hex_color, default="#FF0036", name="background color")
-        light_hex, light_rgb = self.parse_hex_color(light_text_hex_color, default="#FFFFFF", name="light text color")
-        dark_hex, dark_rgb = self.parse_hex_color(dark_text_hex_color, default="#000000", name="dark text color")
+        bg_hex_color, bg_rgb = parse_hex_color(bg_hex_color, default="#FF0036", name="background color", node="BK_ColorContrast")
+        light_hex, light_rgb = parse_hex_color(light_text_hex_color, default="#FFFFFF", name="light text color", node="BK_ColorContrast")
+        dark_hex, dark_rgb = parse_hex_color(dark_text_hex_color, default="#000000", name="dark text color", node="BK_ColorContrast")
         
-        # Calculate background luminance
-        bg_luminance, _, _ = self.get_luminance_and_contrast(bg_rgb, bg_rgb)
+        # Calculate background luminance and the contrast of the light and dark text options
+        bg_luminance, _, (light_contrast, dark_contrast) = self.get_luminance_and_contrast(bg_rgb, [light_rgb, dark_rgb])
         print(f"[BK_ColorContrast] ├ PROCE Background luminance: {bg_luminance:.4f}")
         
-        # Calculate luminance and contrast for light and dark text options
-        _, light_luminance, light_contrast = self.get_luminance_and_contrast(bg_rgb, light_rgb)
-        _, dark_luminance, dark_contrast = self.get_luminance_and_contrast(bg_rgb, dark_rgb)
-        
         # Log contrast values
         print(f"[BK_ColorContrast] ├ PROCE Light contrast: {light_contrast:.2f}, Dark contrast: {dark_contrast:.2f}")
         
         # Determine WCAG contrast threshold
-        threshold = 7.0 if WCAG_level == "AAA" else 4.5
+        threshold = wcag_threshold(WCAG_level)
         print(f"[BK_ColorContrast] ├ PROCE Using WCAG {WCAG_level} level, threshold: {threshold}")
         
+        # Search the nearest compliant color of the same hue as the light or dark text color
+        if text_mode == "search":
+            selected_color, contrast_value, passes = self.search_text_color(bg_luminance, [light_rgb, dark_rgb], threshold)
+            if passes:
+                print(f"[BK_ColorContrast] ○ OUTPUT Found text color: {selected_color} (contrast: {contrast_value:.2f})")
+            else:
+                print("[BK_ColorContrast] ├ WARNING No color of the text hues meets the threshold")
+                print(f"[BK_ColorContrast] ○ OUTPUT Selected {selected_color} with best contrast: {contrast_value:.2f}")
+
         # Choose best text color based on contrast
-        if light_contrast >= threshold and light_contrast >= dark_contrast:
+        elif light_contrast >= threshold and light_contrast >= dark_contrast:
             selected_color = light_hex
             contrast_value = light_contrast
             print(f"[BK_ColorContrast] ○ OUTPUT Selected light text color: {selected_color} (contrast: {contrast_value:.2f})")
@@ -0,0 +1,136 @@
+import math
+from functools import lru_cache
+import torch
+from .functions_color import contrast_ratio_array, image_luminance, parse_hex_color, relative_luminance, wcag_threshold
+
+# Pixels evaluated per chunk, bounding the temporaries of large frames
+CONTRAST_CHUNK_PIXELS = 1 << 20
+
+# Highest possible WCAG contrast ratio (white on black)
+MAX_CONTRAST = 21.0
+
+# Colors of the heatmap colormap, over log contrast
+HEATMAP_BINS = 1024
+
+
+class BK_ColorContrastMap:
+    """
+    Node for checking the legibility of a text color over a background image.
+    Computes the WCAG contrast ratio of the text color against every pixel of an
+    IMAGE batch and reports where, and how much of each frame, fails the level.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "text_hex_color": ("STRING", {"default": "#FFFFFF"}),
+                "WCAG_level": (["AA", "AAA"], {"default": "AA"}),
+            },
+            "optional": {
+                "mask": ("MASK",),
+            }
+        }
+
+    CATEGORY = "⭐️ Baikong/Color"
+    RETURN_TYPES = ("IMAGE", "MASK", "FLOAT", "STRING",)
+    RETURN_NAMES = ("CONTRAST_MAP", "PASS_MASK", "COVERAGE", "STATS",)
+    FUNCTION = "exec"
+    OUTPUT_NODE = True
+    DESCRIPTION = """
+Compute the per-pixel WCAG contrast ratio of a text color over an image batch, with a heatmap, a pass mask and pass coverage per frame
+逐像素计算文字颜色与图像批次之间的 WCAG 对比度，输出热力图、达标遮罩以及每帧的达标覆盖率
+Connect a mask to only count the region where the text is drawn
+连接遮罩后只统计文字所在区域
+"""
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def heatmap_colors(threshold, device="cpu", bins=HEATMAP_BINS):
+        """
+        (bins, 3) colormap over log contrast from 1:1 to 21:1: failing ratios from dark red
+        to orange below the threshold, passing ratios from yellow-green to green above it
+        """
+        log_contrast = torch.linspace(0, math.log(MAX_CONTRAST), bins)
+        fail = (log_contrast / math.log(threshold)).clamp(0, 1)
+        margin = ((log_contrast - math.log(threshold)) / math.log(MAX_CONTRAST / threshold)).clamp(0, 1)
+        fail_color = torch.stack([0.5 + 0.5 * fail, 0.5 * fail, torch.zeros_like(fail)], dim=-1)
+        pass_color = torch.stack([0.6 * (1 - margin), 0.6 + 0.3 * margin, torch.zeros_like(margin)], dim=-1)
+        return torch.where((log_contrast >= math.log(threshold)).unsqueeze(-1), pass_color, fail_color).to(device)
+
+    def contrast_heatmap(self, contrast, threshold):
+        """Color contrast ratios through the cached colormap"""
+        colors = self.heatmap_colors(threshold, str(contrast.device))
+        index = contrast.log().mul_((colors.shape[0] - 1) / math.log(MAX_CONTRAST)).round_().to(torch.int32)
+        return colors.index_select(0, index.clamp_(0, colors.shape[0] - 1))
+
+    def contrast_map(self, image, text_luminance, threshold, chunk_pixels=CONTRAST_CHUNK_PIXELS):
+        """
+        Per-pixel contrast of every frame, chunk by chunk into preallocated outputs.
+        Returns the heatmap (B, H, W, 3), the contrast ratios (B, H, W) and the pass mask (B, H, W).
+        """
+        batch, height, width = image.shape[:3]
+        heatmap = torch.empty((batch, height, width, 3), dtype=torch.float32, device=image.device)
+        contrast = torch.empty((batch, height, width), dtype=torch.float32, device=image.device)
+
+        pixels = image[..., :3].reshape(-1, 3)
+        heatmap_flat = heatmap.view(-1, 3)
+        contrast_flat = contrast.view(-1)
+        for start in range(0, pixels.shape[0], chunk_pixels):
+            end = start + chunk_pixels
+            ratio = contrast_ratio_array(image_luminance(pixels[start:end]), text_luminance)
+            contrast_flat[start:end] = ratio
+            heatmap_flat[start:end] = self.contrast_heatmap(ratio, threshold)
+
+        return heatmap, contrast, (contrast >= threshold).float()
+
+    def exec(self, image, text_hex_color="#FFFFFF", WCAG_level="AA", mask=None):
+        """
+        Compute the contrast map of a text color over an image batch.
+        Coverage is the share of counted pixels (all, or those inside the mask) meeting the WCAG level.
+        """
+        text_hex_color, text_rgb = parse_hex_color(text_hex_color, default="#FFFFFF", name="text color",
+                                                   node="BK_ColorContrastMap")
+        threshold = wcag_threshold(WCAG_level)
+        text_luminance = relative_luminance(*text_rgb)
+        print(f"[BK_ColorContrastMap] ○ INPUT Image shape: {tuple(image.shape)}, Text color: {text_hex_color}, "
+              f"WCAG {WCAG_level} threshold: {threshold}")
+
+        heatmap, contrast, pass_mask = self.contrast_map(image, text_luminance, threshold)
+
+        # Pixels counted in the statistics, one mask broadcast over the batch or one per frame
+        if mask is not None:
+            region = mask.to(image.device).reshape(-1, *mask.shape[-2:]) > 0.5
+            if region.shape[-2:] != contrast.shape[-2:]:
+                print(f"[BK_ColorContrastMap] ├ WARNING Mask size {tuple(region.shape[-2:])} does not match the image. Using all pixels.")
+                region = torch.ones_like(contrast, dtype=torch.bool)
+            else:
+                region = region.expand_as(contrast)
+        else:
+            region = torch.ones_like(contrast, dtype=torch.bool)
+
+        counted = region.flatten(1).sum(dim=1)
+        passed = (pass_mask.bool() & region).flatten(1).sum(dim=1)
+        masked = torch.where(region, contrast, torch.full_like(contrast, float("inf"))).flatten(1)
+        min_contrast = masked.min(dim=1).values
+        coverage = passed.float() / counted.clamp(min=1).float()
+        total_coverage = passed.sum().item() / max(1, counted.sum().item())
+
+        # Per-frame statistics
+        lines = []
+        for i in range(contrast.shape[0]):
+            if counted[i] == 0:
+                lines.append(f"frame {i}: no pixels in mask")
+                continue
+            lines.append(f"frame {i}: pass {coverage[i].item() * 100:.1f}%, min contrast {min_contrast[i].item():.2f}")
+        failing = int(((coverage < 1.0) & (counted > 0)).sum().item())
+        summary = (f"{text_hex_color} WCAG {WCAG_level}: pass {total_coverage * 100:.1f}% of pixels, "
+                   f"{failing}/{contrast.shape[0]} frames with failing pixels")
+        stats = "\n".join([summary] + lines)
+        print(f"[BK_ColorContrastMap] ○ OUTPUT {summary}")
+
+        return {
+            "ui": {"text": [stats]},
+            "result": (heatmap, pass_mask, total_coverage, stats)
+        }
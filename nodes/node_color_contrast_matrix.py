@@ -0,0 +1,127 @@
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+from .functions_color import Palette, contrast_ratio_array, read_palette, relative_luminance_array, wcag_threshold
+from .functions_image import pil2tensor
+
+
+class BK_ColorContrastMatrix:
+    """
+    Node for checking every text/background pairing of two palettes against WCAG.
+    Computes the full N×M contrast matrix in one vectorised pass and returns the
+    passing pairs sorted by contrast, with a swatch-grid preview of all pairings.
+    """
+
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "text_palette": ("STRING", {"default": "#FFFFFF, #000000"}),
+                "bg_palette": ("STRING", {"default": "#FF0036, #34C3EB"}),
+                "WCAG_level": (["AA", "AAA"], {"default": "AA"}),
+            },
+            "optional": {
+                "preview": ("BOOLEAN", {"default": True}),
+                "preview_size": ("INT", {"default": 512, "min": 64, "max": 4096, "step": 64}),
+                "text_colors": ("PALETTE",),
+                "bg_colors": ("PALETTE",),
+            },
+        }
+
+    CATEGORY = "⭐️ Baikong/Color"
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "IMAGE",)
+    RETURN_NAMES = ("PAIRS", "TEXT_COLOR", "BG_COLOR", "PREVIEW",)
+    OUTPUT_IS_LIST = (False, True, True, False,)
+    FUNCTION = "exec"
+    OUTPUT_NODE = True
+    DESCRIPTION = """
+Check every text color against every background color of two comma-separated palettes, and return the pairs meeting the WCAG level sorted by contrast
+计算两个以英文逗号分隔的调色板之间所有文字色/背景色组合的对比度，按对比度从高到低返回满足 WCAG 等级的组合
+TEXT_COLOR and BG_COLOR list the passing pairs one by one, or the highest-contrast pair when none passes; the preview grid crosses out failing pairs
+TEXT_COLOR 与 BG_COLOR 逐个列出达标组合，没有达标组合时输出对比度最高的组合；预览网格中不达标的组合会被划掉
+Connected text_colors / bg_colors PALETTE inputs replace the palette strings
+连接 text_colors / bg_colors 调色板时将替代对应的字符串输入
+"""
+
+    @staticmethod
+    def contrast_matrix(text_rgb, bg_rgb):
+        """(N, M) contrast ratios of N text colors over M background colors"""
+        luminance = relative_luminance_array(np.concatenate([text_rgb, bg_rgb]))
+        return contrast_ratio_array(luminance[:len(text_rgb), None], luminance[None, len(text_rgb):])
+
+    def draw_swatch_grid(self, text_hex, bg_hex, text_rgb, bg_rgb, contrast, threshold, preview_size):
+        """One cell per pairing: rows are backgrounds, columns are text colors"""
+        rows, columns = len(bg_hex), len(text_hex)
+        cell = max(32, preview_size // max(rows, columns))
+
+        # Fill every cell with its background color at once
+        grid = np.repeat(np.repeat(bg_rgb[:, None, :], cell, axis=0), columns * cell, axis=1)
+        img = Image.fromarray(np.ascontiguousarray(grid, dtype=np.uint8))
+        draw = ImageDraw.Draw(img)
+
+        for row in range(rows):
+            for column in range(columns):
+                x0, y0 = column * cell, row * cell
+                color = tuple(int(c) for c in text_rgb[column])
+                draw.text((x0 + 6, y0 + 6), "Aa", fill=color)
+                draw.text((x0 + 6, y0 + cell - 18), f"{contrast[column, row]:.2f}", fill=color)
+                if contrast[column, row] < threshold:
+                    # Cross out failing pairs
+                    draw.line([x0 + 4, y0 + 4, x0 + cell - 5, y0 + cell - 5], fill=color, width=1)
+                    draw.line([x0 + cell - 5, y0 + 4, x0 + 4, y0 + cell - 5], fill=color, width=1)
+
+        return img
+
+    def exec(
+        self,
+        text_palette,
+        bg_palette,
+        WCAG_level="AA",
+        preview: bool = True,
+        preview_size: int = 512,
+        text_colors: Palette = None,
+        bg_colors: Palette = None,
+    ):
+        """
+        Compute the contrast of every text/background pairing of two palettes.
+        Returns the passing pairs sorted by contrast, and the preview grid when enabled.
+        When no pair passes, the list outputs hold the highest-contrast pair, so they are never empty.
+        """
+        text_hex, text_rgb = read_palette(text_colors, text_palette, default="#FFFFFF", name="text color",
+                                          node="BK_ColorContrastMatrix")
+        bg_hex, bg_rgb = read_palette(bg_colors, bg_palette, default="#FF0036", name="background color",
+                                      node="BK_ColorContrastMatrix")
+        threshold = wcag_threshold(WCAG_level)
+        print(f"[BK_ColorContrastMatrix] ○ INPUT {len(text_hex)} text colors, {len(bg_hex)} background colors, "
+              f"WCAG {WCAG_level} threshold: {threshold}")
+
+        contrast = self.contrast_matrix(text_rgb, bg_rgb)
+
+        # Passing pairs, highest contrast first
+        text_index, bg_index = np.nonzero(contrast >= threshold)
+        order = np.argsort(-contrast[text_index, bg_index], kind="stable")
+        text_index, bg_index = text_index[order], bg_index[order]
+        pairs = [f"{text_hex[i]} on {bg_hex[j]}: {contrast[i, j]:.2f}" for i, j in zip(text_index, bg_index)]
+        print(f"[BK_ColorContrastMatrix] ├ PROCE {len(pairs)}/{contrast.size} pairs meet the threshold")
+
+        if not pairs:
+            # Empty list outputs would stop the downstream nodes, fall back to the best pair
+            text_index, bg_index = np.unravel_index([np.argmax(contrast)], contrast.shape)
+            i, j = text_index[0], bg_index[0]
+            print(f"[BK_ColorContrastMatrix] ├ WARNING No pair meets the threshold. Using the best pair "
+                  f"{text_hex[i]} on {bg_hex[j]}: {contrast[i, j]:.2f} instead.")
+
+        # Create visualization only when it is enabled
+        if preview:
+            img = self.draw_swatch_grid(text_hex, bg_hex, text_rgb, bg_rgb, contrast, threshold, max(64, preview_size))
+            img_tensor = pil2tensor(img)
+        else:
+            img_tensor = torch.zeros((1, 1, 1, 3), dtype=torch.float32)
+
+        result = "\n".join(pairs)
+        print(f"[BK_ColorContrastMatrix] ○ OUTPUT Best pair: {pairs[0] if pairs else 'none'}")
+
+        return {
+            "ui": {"text": [result or "No pair meets the threshold"]},
+            "result": (result, [text_hex[i] for i in text_index], [bg_hex[j] for j in bg_index], img_tensor)
+        }
@@ -1,33 +1,59 @@
 import math
-import colorsys
+from functools import lru_cache
 import numpy as np
 import torch
+import torch.nn.functional as F
 from PIL import Image, ImageDraw
-# from .functions_color import rgb_to_hsl, hsl_to_rgb
-# from .functions_image import pil2tensor, tensor2pil
+from .functions_color import (
+    Palette, hsv_to_rgb_array, hsv_to_rgb_float_array, read_palette, rgb_to_hex_array, rgb_to_hsv_array,
+)
+from .functions_image import pil2tensor
 
-# 将 rgb 元组转换成 hsv
-def rgb_to_hsv(rgb):
-    r, g, b = rgb
-    h, s, v = colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
-    return h, s, v
+# Number of cached hue steps for the color domain background (0.1 degree)
+DOMAIN_HUE_STEPS = 3600
 
-# 将 hsv 元组转换成 rgb
-def hsv_to_rgb(hsv):
-    h, s, v = hsv
-    r, g, b = colorsys.hsv_to_rgb(h, s, v)
-    r = int(r * 255.0)
-    g = int(g * 255.0)
-    b = int(b * 255.0)
-    return r, g, b
+# 缓存色域背景图，键为量化后的色相和尺寸
+@lru_cache(maxsize=32)
+def color_domain_background(hue_step, img_size):
+    """Saturation (x) / brightness (y) plane of a quantised hue, shared between executions"""
+    s_grid, v_grid = np.meshgrid(np.linspace(0, 1, img_size), np.linspace(1, 0, img_size))
+    return Image.fromarray(hsv_to_rgb_array(hue_step / DOMAIN_HUE_STEPS, s_grid, v_grid))
 
-# Tensor to PIL
-def tensor2pil(image):
-    return Image.fromarray(np.clip(255. * image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+# Grid points per channel of the image-mode lookup table
+LUT_SIZE = 33
 
-# Convert PIL to Tensor
-def pil2tensor(image):
-    return torch.from_numpy(np.array(image).astype(np.float32) / 255.0).unsqueeze(0) 
+# Pixels interpolated per chunk when applying the lookup table
+LUT_CHUNK_PIXELS = 1 << 20
+
+# 缓存饱和度/亮度限制的 3D 查找表，键为限制参数
+@lru_cache(maxsize=8)
+def color_limit_lut(limits, lut_size=LUT_SIZE):
+    """
+    (1, 3, R, G, B) float32 lookup table of the limited color for every RGB grid point,
+    laid out for F.grid_sample
+    """
+    saturation_start, saturation_end, brightness_start, brightness_end = limits
+    levels = np.linspace(0, 255, lut_size)
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1)
+    h, s, v = rgb_to_hsv_array(grid)
+    rgb = hsv_to_rgb_float_array(h,
+                                 np.clip(s, saturation_start, saturation_end),
+                                 np.clip(v, brightness_start, brightness_end))
+    return torch.from_numpy(rgb.astype(np.float32)).permute(3, 0, 1, 2).unsqueeze(0).contiguous()
+
+# 用查找表和三线性插值限制整张图像
+def apply_color_lut(image, lut, chunk_pixels=LUT_CHUNK_PIXELS):
+    """Map the RGB channels of an IMAGE batch through a lookup table, chunk by chunk"""
+    lut = lut.to(device=image.device)
+    result = image.clone()
+    pixels = result.reshape(-1, image.shape[-1])
+    for start in range(0, pixels.shape[0], chunk_pixels):
+        chunk = pixels[start:start + chunk_pixels, :3]
+        # grid_sample takes (x, y, z) = (B, G, R) coordinates in [-1, 1] for a (R, G, B) volume
+        grid = (chunk.flip(-1).float() * 2 - 1).reshape(1, 1, 1, -1, 3)
+        mapped = F.grid_sample(lut, grid, mode='bilinear', padding_mode='border', align_corners=True)
+        chunk.copy_(mapped.reshape(3, -1).T)
+    return result
 
 class BK_ColorLimit:
     """
@@ -72,77 +98,38 @@ class BK_ColorLimit:
                     "step": 0.01,
                     "display": "slider"
                 }),
-            }
+                "image": ("IMAGE",),
+                "preview": ("BOOLEAN", {"default": True}),
+                "preview_size": ("INT", {
+                    "default": 512,
+                    "min": 64,
+                    "max": 4096,
+                    "step": 64,
+                }),
+                "palette": ("PALETTE",),
+            },
         }
 
     CATEGORY = "⭐️ Baikong/Color"
-    RETURN_TYPES = ("STRING", "IMAGE",)
-    RETURN_NAMES = ("STRING", "PREVIEW")
+    RETURN_TYPES = ("STRING", "IMAGE", "IMAGE", "PALETTE",)
+    RETURN_NAMES = ("STRING", "PREVIEW", "IMAGE", "PALETTE")
     FUNCTION = "color_limit"
     DESCRIPTION = """
-Input a HEX color and generate a new color based on the set saturation and brightness range limits
-输入十六进制颜色，并根据设定的饱和度和亮度范围限制，生成新的颜色
+Input a HEX color, or comma-separated HEX colors, and generate new colors based on the set saturation and brightness range limits
+输入十六进制颜色（或以英文逗号分隔的多个颜色），并根据设定的饱和度和亮度范围限制，生成新的颜色
+Connect an image to apply the same limits to every pixel through a cached 3D lookup table
+连接图像后，通过缓存的 3D 查找表对每个像素应用相同的限制
+The preview is only rendered when enabled; turn it off when PREVIEW is not used
+仅在开启 preview 时才生成预览图，不使用 PREVIEW 输出时可关闭以节省时间
+A connected PALETTE replaces hex_color, and the PALETTE output keeps its weights
+连接 PALETTE 时将替代 hex_color，输出的 PALETTE 保留原有权重
 """
 
-    @staticmethod
-    def hex_to_rgb(hex_color):
-        """Convert hex color string to RGB tuple"""
-        # Ensure proper format with leading #
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) != 6:
-            # Default to red if incorrect format
-            print(f"[BK_ColorLimit] ├ WARNING Invalid hex color format: {hex_color}. Using default red color.")
-            hex_color = "FF0036"
-        
-        try:
-            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        except ValueError:
-            print(f"[BK_ColorLimit] ├ WARNING Could not parse hex color: {hex_color}. Using default red color.")
-            return (255, 0, 54)  # Default red color
-
-    @staticmethod
-    def rgb_to_hsv(rgb):
-        """Convert RGB tuple to HSV values"""
-        r, g, b = rgb
-        h, s, v = colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0)
-        return h, s, v
-
-    @staticmethod
-    def hsv_to_rgb(hsv):
-        """Convert HSV values to RGB tuple"""
-        h, s, v = hsv
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        return int(r * 255.0), int(g * 255.0), int(b * 255.0)
-
-    @staticmethod
-    def pil2tensor(image):
-        """Convert PIL image to tensor"""
-        return torch.from_numpy(np.array(image).astype(np.float32) / 255.0).unsqueeze(0)
-
     def create_color_domain_image(self, h, img_size):
-        """Create a color domain image for a given hue using numpy for efficiency"""
-        # Create coordinate grids for S and V
-        x = np.linspace(0, 1, img_size)
-        y = np.linspace(1, 0, img_size)
-        s_grid, v_grid = np.meshgrid(x, y)
-        
-        # Create empty image array
-        img_array = np.zeros((img_size, img_size, 3), dtype=np.uint8)
-        
-        # Create HSV arrays with broadcasting
-        hsv_array = np.dstack([
-            np.full_like(s_grid, h),
-            s_grid,
-            v_grid
-        ])
-        
-        # Convert HSV to RGB efficiently
-        for y in range(img_size):
-            for x in range(img_size):
-                hsv = hsv_array[y, x]
-                img_array[y, x] = self.hsv_to_rgb(hsv)
-        
-        return Image.fromarray(img_array)
+        """Create a color domain image for a given hue, reusing cached backgrounds"""
+        hue_step = int(round(h * DOMAIN_HUE_STEPS)) % DOMAIN_HUE_STEPS
+        # Copy so the overlay drawing does not touch the cached background
+        return color_domain_background(hue_step, img_size).copy()
 
     def draw_dashed_rectangle(self, draw, bbox, color='white', width=1, dash_length=4):
         """Draw a dashed rectangle on the image"""
@@ -173,52 +160,14 @@ Input a HEX color and generate a new color based on the set saturation and brigh
         draw.line([x2, y2, x2 - head_length * math.cos(angle + math.pi/6), y2 - head_length * math.sin(angle + math.pi/6)], 
                  fill=color, width=width)
 
-    def color_limit(
-        self,
-        hex_color,
-        saturation_start: float = 0,
-        saturation_end: float = 1,
-        brightness_start: float = 0,
-        brightness_end: float = 1,
-    ):
-        """
-        Limit a color's saturation and brightness values within specified ranges.
-        Generates a new color and a visual preview of the color domain.
-        """
-        # Input validation and normalization
-        saturation_start = max(0.0, min(1.0, saturation_start))
-        saturation_end = max(saturation_start, min(1.0, saturation_end))
-        brightness_start = max(0.0, min(1.0, brightness_start))
-        brightness_end = max(brightness_start, min(1.0, brightness_end))
-        
-        # Ensure hex_color starts with #
-        if not hex_color.startswith('#'):
-            hex_color = f"#{hex_color}"
-        
-        # Parse and convert colors
-        rgb_color = self.hex_to_rgb(hex_color)
-        h, s, v = self.rgb_to_hsv(rgb_color)
-        
-        # Round to six decimal places
-        h, s, v = round(h, 6), round(s, 6), round(v, 6)
-        
-        # Apply saturation and brightness limits
-        s_new = max(saturation_start, min(s, saturation_end))
-        v_new = max(brightness_start, min(v, brightness_end))
-        
-        # Generate new color
-        rgb_new = self.hsv_to_rgb((h, s_new, v_new))
-        hex_new = '#{:02x}{:02x}{:02x}'.format(*rgb_new)
-        
-        # Log information
-        print(f"[BK_ColorLimit] ○ INPUT Original color: {hex_color}")
-        print(f"[BK_ColorLimit] ├ PROCE HSV: ({h:.4f}, {s:.4f}, {v:.4f}) -> ({h:.4f}, {s_new:.4f}, {v_new:.4f})")
-        print(f"[BK_ColorLimit] ○ OUTPUT New color: {hex_new}")
-        
-        # Create visualization
-        img_size = 512
+    def draw_limit_preview(self, h, s, v, s_new, v_new, limits, img_size):
+        """Draw the color domain of one color with the limit rectangle and before/after markers"""
+        saturation_start, saturation_end, brightness_start, brightness_end = limits
         img = self.create_color_domain_image(h, img_size)
         draw = ImageDraw.Draw(img)
+
+        # Marker sizes are tuned for a 512px preview and scaled with the panel
+        scale = img_size / 512
         
         # Calculate positions for visualization elements
         x1 = int(saturation_start * (img_size - 1))
@@ -227,12 +176,13 @@ Input a HEX color and generate a new color based on the set saturation and brigh
         y2 = int((1 - brightness_start) * (img_size - 1))
         
         # Draw constraint rectangle
-        self.draw_dashed_rectangle(draw, (x1, y1, x2, y2), color='white', width=1, dash_length=4)
+        self.draw_dashed_rectangle(draw, (x1, y1, x2, y2), color='white', width=1,
+                                   dash_length=max(2, round(4 * scale)))
         
         # Calculate and draw before/after positions
-        dot_size = 12
-        dot_width = 4
-        arrow_gap = 12
+        dot_size = max(3, round(12 * scale))
+        dot_width = max(1, round(4 * scale))
+        arrow_gap = max(3, round(12 * scale))
         
         # Original color position
         x_before = int(s * (img_size - 1))
@@ -262,15 +212,89 @@ Input a HEX color and generate a new color based on the set saturation and brigh
             end_y = y_after - (dot_size + arrow_gap) * math.sin(angle)
             
             # Draw arrow
-            self.draw_arrow(draw, (start_x, start_y), (end_x, end_y), color='white', width=2, head_length=7)
+            self.draw_arrow(draw, (start_x, start_y), (end_x, end_y), color='white',
+                            width=max(1, round(2 * scale)), head_length=max(3, round(7 * scale)))
+
+        return img
+
+    def color_limit(
+        self,
+        hex_color,
+        saturation_start: float = 0,
+        saturation_end: float = 1,
+        brightness_start: float = 0,
+        brightness_end: float = 1,
+        image=None,
+        preview: bool = True,
+        preview_size: int = 512,
+        palette: Palette = None,
+    ):
+        """
+        Limit the saturation and brightness of a color, or of every color of a
+        comma-separated palette, within specified ranges.
+        Generates the new colors and one preview sheet of their color domains.
+        When an image is given, every pixel is limited through a 3D lookup table.
+        The preview is skipped when disabled. It does not depend on the output links,
+        which ComfyUI's output cache does not see.
+        """
+        # Input validation and normalization
+        saturation_start = max(0.0, min(1.0, saturation_start))
+        saturation_end = max(saturation_start, min(1.0, saturation_end))
+        brightness_start = max(0.0, min(1.0, brightness_start))
+        brightness_end = max(brightness_start, min(1.0, brightness_end))
+        limits = (saturation_start, saturation_end, brightness_start, brightness_end)
+        
+        # Parse and convert all colors at once
+        hex_colors, rgb_colors = read_palette(palette, hex_color, default="#FF0036", name="hex color", node="BK_ColorLimit")
+        h, s, v = rgb_to_hsv_array(rgb_colors)
+        
+        # Round to six decimal places
+        h, s, v = np.round(h, 6), np.round(s, 6), np.round(v, 6)
         
-        # Convert image to tensor
-        img_tensor = self.pil2tensor(img.convert('RGB'))
+        # Apply saturation and brightness limits
+        s_new = np.clip(s, saturation_start, saturation_end)
+        v_new = np.clip(v, brightness_start, brightness_end)
+        
+        # Generate new colors
+        rgb_new = hsv_to_rgb_array(h, s_new, v_new)
+        hex_new = ", ".join(rgb_to_hex_array(rgb_new))
+        limited_palette = Palette(rgb_new, palette.weights if palette is not None and len(palette) else None)
+        
+        # Log information
+        print(f"[BK_ColorLimit] ○ INPUT Original color: {', '.join(hex_colors)}")
+        for i in range(len(hex_colors)):
+            print(f"[BK_ColorLimit] ├ PROCE HSV: ({h[i]:.4f}, {s[i]:.4f}, {v[i]:.4f}) -> "
+                  f"({h[i]:.4f}, {s_new[i]:.4f}, {v_new[i]:.4f})")
+        print(f"[BK_ColorLimit] ○ OUTPUT New color: {hex_new}")
+        
+        # Create visualization: one panel per color on a near-square sheet about preview_size wide
+        if preview:
+            preview_size = max(64, preview_size)
+            columns = math.ceil(math.sqrt(len(hex_colors)))
+            rows = math.ceil(len(hex_colors) / columns)
+            panel_size = max(16, preview_size // columns)
+            img = Image.new('RGB', (columns * panel_size, rows * panel_size))
+            for i in range(len(hex_colors)):
+                panel = self.draw_limit_preview(h[i], s[i], v[i], s_new[i], v_new[i], limits, panel_size)
+                img.paste(panel, ((i % columns) * panel_size, (i // columns) * panel_size))
+
+            # Convert image to tensor
+            img_tensor = pil2tensor(img)
+        else:
+            img_tensor = torch.zeros((1, 1, 1, 3), dtype=torch.float32)
+
+        # Limit every pixel of the image batch through the cached lookup table
+        if image is not None:
+            lut = color_limit_lut(tuple(round(limit, 4) for limit in limits))
+            limited_image = apply_color_lut(image, lut)
+            print(f"[BK_ColorLimit] ○ OUTPUT Limited image: {tuple(limited_image.shape)}")
+        else:
+            limited_image = torch.zeros((1, 1, 1, 3), dtype=torch.float32)
         
         # Return results
         return {
             "ui": {"text": [{"bg_color": hex_new, }], },
-            "result": (hex_new, img_tensor)
+            "result": (hex_new, img_tensor, limited_image, limited_palette)
         }
 
 
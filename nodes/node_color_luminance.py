@@ -1,10 +1,23 @@
-from .functions_color import relative_luminance
+import math
+import numpy as np
+import torch
+from .functions_color import image_luminance, parse_hex_color, relative_luminance, rgb_to_hex_array
+from .functions_image import parse_regions, region_means, summed_area_table
+
+# Pixels sampled per frame (or region) for percentile statistics
+FRAME_SAMPLE_PIXELS = 1 << 12
+
+# Pixels measured together in the batched whole-frame pass
+FRAME_CHUNK_PIXELS = 1 << 22
 
 class BK_ColorLuminance:
     """
     Node for determining appropriate text color based on background color luminance.
     Calculates luminance of a background color and compares with threshold to determine
     if light or dark text should be used for better readability.
+    With an image, the background is the mean (or a percentile) luminance of every
+    frame, or of rectangular regions of every frame measured through one summed-area
+    table per frame, with optional hysteresis against flickering text colors.
     """
 
     @classmethod
@@ -17,41 +30,90 @@ class BK_ColorLuminance:
             "optional": {
                 "light_text_hex_color": ("STRING", {"default": ""}),
                 "dark_text_hex_color": ("STRING", {"default": ""}),
+                "image": ("IMAGE",),
+                "regions": ("STRING", {"default": "", "multiline": True}),
+                "statistic": (["mean", "percentile"], {"default": "mean"}),
+                "percentile": ("FLOAT", {"default": 50.0, "min": 0.0, "max": 100.0, "step": 1.0}),
+                "hysteresis": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 0.5, "step": 0.01}),
             }
         }
 
     CATEGORY = "⭐️ Baikong/Color"
-    RETURN_TYPES = ("STRING", "STRING", )
-    RETURN_NAMES = ("BG_COLOR", "TEXT_COLOR", )
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING", )
+    RETURN_NAMES = ("BG_COLOR", "TEXT_COLOR", "REGION_BG_COLOR", "REGION_TEXT_COLOR", )
+    OUTPUT_IS_LIST = (False, False, True, True, )
     FUNCTION = "exec"
     OUTPUT_NODE = True
-    DESCRIPTION = "计算颜色明度，明度小于阈值返回亮色，大于阈值返回暗色"
+    DESCRIPTION = """
+计算颜色明度，明度小于阈值返回亮色，大于阈值返回暗色
+连接图像后，按 regions 中的矩形区域（x, y, width, height，以分号或换行分隔，留空为整张图像）计算每一帧的平均明度或百分位明度（百分位明度取自均匀采样的像素）；REGION 输出按帧、按区域依次列出
+hysteresis 大于 0 时，明度需越过阈值 ± hysteresis 才会切换文字颜色，避免视频中逐帧闪烁
+"""
 
     @staticmethod
-    def parse_hex_color(hex_color, default="#FFFFFF", name="color"):
-        """Safely parse a hex color string to RGB values"""
-        # Ensure proper format with leading #
-        if not hex_color.startswith('#'):
-            hex_color = f"#{hex_color}"
-        
-        # Validate length
-        if len(hex_color) != 7:
-            print(f"[BK_ColorLuminance] ├ WARNING Invalid {name} format: {hex_color}. Using {default} instead.")
-            hex_color = default
-            
-        try:
-            # Extract RGB components
-            r = int(hex_color[1:3], 16)
-            g = int(hex_color[3:5], 16)
-            b = int(hex_color[5:7], 16)
-            return hex_color, (r, g, b)
-        except ValueError:
-            print(f"[BK_ColorLuminance] ├ WARNING Could not parse {name}: {hex_color}. Using {default} instead.")
-            # Parse the default color instead
-            r = int(default[1:3], 16)
-            g = int(default[3:5], 16)
-            b = int(default[5:7], 16)
-            return default, (r, g, b)
+    def sample_stride(height, width):
+        """Pixel stride keeping about FRAME_SAMPLE_PIXELS pixels of a height x width area"""
+        return max(1, math.ceil(math.sqrt(height * width / FRAME_SAMPLE_PIXELS)))
+
+    @staticmethod
+    def luminance_percentile(luminance, percentile):
+        """Nearest-rank percentile along the last axis"""
+        k = int(round(percentile / 100.0 * (luminance.shape[-1] - 1))) + 1
+        return luminance.kthvalue(k, dim=-1).values
+
+    def frame_luminance(self, image, statistic="mean", percentile=50.0):
+        """
+        Luminance statistic (B, 1) and mean color (B, 1, 3) of every whole frame, measured
+        for about FRAME_CHUNK_PIXELS pixels at a time. Means are exact over every pixel,
+        percentiles are taken from a strided pixel sample.
+        """
+        stride = self.sample_stride(image.shape[1], image.shape[2])
+        chunk = max(1, FRAME_CHUNK_PIXELS // (image.shape[1] * image.shape[2]))
+        luminance, colors = [], []
+        for start in range(0, image.shape[0], chunk):
+            frames = image[start:start + chunk, ..., :3]
+            colors.append(frames.mean(dim=(1, 2), dtype=torch.float64))
+            if statistic == "percentile":
+                sample = frames[:, ::stride, ::stride].reshape(frames.shape[0], -1, 3)
+                luminance.append(self.luminance_percentile(image_luminance(sample), percentile))
+            else:
+                luminance.append(image_luminance(frames).mean(dim=(1, 2), dtype=torch.float64))
+        return torch.cat(luminance)[:, None].cpu().numpy(), torch.cat(colors)[:, None].cpu().numpy()
+
+    def region_luminance(self, image, boxes, statistic="mean", percentile=50.0):
+        """
+        Luminance statistic (B, R) and mean color (B, R, 3) of every region of every frame.
+        Each frame's RGB and luminance are turned into one summed-area table, then every
+        region mean is an O(1) query; percentiles are taken from a strided region sample.
+        """
+        luminance, colors = [], []
+        for frame in image:
+            channels = torch.cat([frame[..., :3], image_luminance(frame)[..., None]], dim=-1)
+            means = region_means(summed_area_table(channels), boxes)
+            colors.append(means[:, :3])
+            if statistic == "percentile":
+                values = []
+                for x0, y0, x1, y1 in boxes:
+                    stride = self.sample_stride(y1 - y0, x1 - x0)
+                    region = image_luminance(frame[y0:y1:stride, x0:x1:stride]).reshape(-1)
+                    values.append(self.luminance_percentile(region, percentile))
+                luminance.append(torch.stack(values))
+            else:
+                luminance.append(means[:, 3])
+        return torch.stack(luminance).cpu().numpy(), torch.stack(colors).cpu().numpy()
+
+    @staticmethod
+    def dark_text(luminance, threshold, hysteresis=0.0):
+        """
+        (B, R) True where dark text is used. With hysteresis, a region keeps its text color
+        from the previous frame until its luminance crosses threshold ± hysteresis.
+        """
+        dark = luminance > threshold
+        if hysteresis > 0:
+            for i in range(1, len(dark)):
+                dark[i] = np.where(dark[i - 1], luminance[i] >= threshold - hysteresis,
+                                   luminance[i] > threshold + hysteresis)
+        return dark
 
     def exec(
         self,
@@ -59,6 +121,11 @@ class BK_ColorLuminance:
         luminance_threshold=0.5,
         light_text_hex_color="",
         dark_text_hex_color="",
+        image=None,
+        regions="",
+        statistic="mean",
+        percentile=50.0,
+        hysteresis=0.0,
     ):
         """
         Determine appropriate text color based on background color luminance.
@@ -68,6 +135,12 @@ class BK_ColorLuminance:
             luminance_threshold: Threshold for determining light vs dark text (0.0-1.0)
             light_text_hex_color: Light text color (default #FFFFFF if empty)
             dark_text_hex_color: Dark text color (default #000000 if empty)
+            image: Optional IMAGE batch whose regions replace the background color
+            regions: Rectangles "x, y, width, height" separated by ';' or new lines,
+                empty to measure whole frames
+            statistic: "mean" or "percentile" luminance of each frame or region
+            percentile: Percentile (0-100) used by the percentile statistic
+            hysteresis: Luminance margin a region must cross to switch text color between frames
             
         Returns:
             Dictionary containing UI information and result tuple of (bg_color, text_color)
@@ -83,10 +156,30 @@ class BK_ColorLuminance:
         print(f"[BK_ColorLuminance] ○ INPUT Background color: {bg_hex_color}, Threshold: {luminance_threshold:.2f}")
         
         # Parse colors with validation
-        bg_hex_color, bg_rgb = self.parse_hex_color(bg_hex_color, default="#FF0036", name="background color")
-        light_hex, _ = self.parse_hex_color(light_text_hex_color, default="#FFFFFF", name="light text color")
-        dark_hex, _ = self.parse_hex_color(dark_text_hex_color, default="#000000", name="dark text color")
+        bg_hex_color, bg_rgb = parse_hex_color(bg_hex_color, default="#FF0036", name="background color", node="BK_ColorLuminance")
+        light_hex, _ = parse_hex_color(light_text_hex_color, default="#FFFFFF", name="light text color", node="BK_ColorLuminance")
+        dark_hex, _ = parse_hex_color(dark_text_hex_color, default="#000000", name="dark text color", node="BK_ColorLuminance")
         
+        # Measure the regions of every frame instead of the background color
+        if image is not None:
+            percentile = max(0.0, min(100.0, percentile))
+            if regions.strip():
+                boxes = parse_regions(regions, image.shape[2], image.shape[1], node="BK_ColorLuminance")
+                luminance, colors = self.region_luminance(image, boxes, statistic, percentile)
+            else:
+                boxes = [(0, 0, image.shape[2], image.shape[1])]
+                luminance, colors = self.frame_luminance(image, statistic, percentile)
+            region_bg = rgb_to_hex_array((colors * 255.0).round().reshape(-1, 3))
+            dark = self.dark_text(luminance, luminance_threshold, max(0.0, hysteresis))
+            region_text = [dark_hex if value else light_hex for value in dark.ravel()]
+            print(f"[BK_ColorLuminance] ├ PROCE Measured {statistic} luminance of {len(boxes)} regions in "
+                  f"{image.shape[0]} frames, luminance {luminance.min():.4f} - {luminance.max():.4f}")
+            print(f"[BK_ColorLuminance] ○ OUTPUT {region_text.count(dark_hex)} dark, {region_text.count(light_hex)} light text colors")
+            return {
+                "ui": {"text": [{"bg_color": region_bg[0], "front_color": region_text[0]}], },
+                "result": (region_bg[0], region_text[0], region_bg, region_text)
+            }
+
         # Calculate background luminance
         bg_luminance = relative_luminance(*bg_rgb)
         print(f"[BK_ColorLuminance] ├ PROCE Background luminance: {bg_luminance:.4f} (Threshold: {luminance_threshold:.2f})")
@@ -104,7 +197,7 @@ class BK_ColorLuminance:
         # Return UI information and result
         return {
             "ui": {"text": [{"bg_color": bg_hex_color, "front_color": selected_color}], },
-            "result": (bg_hex_color, selected_color)
+            "result": (bg_hex_color, selected_color, [bg_hex_color], [selected_color])
         }
 
 # 测试代码
@@ -1,3 +1,6 @@
+from .functions_color import Palette
+
+
 class BK_ColorSelector:
 
     @classmethod
@@ -22,6 +25,7 @@ class BK_ColorSelector:
                     "step": 1,
                     "display": "number"
                 }),
+                "palette": ("PALETTE",),
             }
         }
 
@@ -29,19 +33,26 @@ class BK_ColorSelector:
     RETURN_TYPES = ("STRING",)
     FUNCTION = "select_color"
     OUTPUT_NODE = False
-    DESCRIPTION = "从输入的多个十六进制颜色中，根据指定的索引选择一个颜色；输入的内容需使用英文逗号分隔"
+    DESCRIPTION = "从输入的多个十六进制颜色中，根据指定的索引选择一个颜色；输入的内容需使用英文逗号分隔；连接 PALETTE 时直接从调色板中选择"
 
     def select_color(
         self,
         hex_colors: str,
         symbol: str = ",",
         split_count: int = 1,
+        palette: Palette = None,
     ) -> dict:
-        print(f"[BK_ColorSelector] ○ INPUT hex_colors: {hex_colors}， symbol: {symbol},split_count: {split_count}")
+        use_palette = palette is not None and len(palette) > 0
+        if use_palette:
+            # 调色板中的颜色已经过校验，无需再分割字符串
+            print(f"[BK_ColorSelector] ○ INPUT palette: {palette}, split_count: {split_count}")
+            color_list = palette.to_hex()
+        else:
+            print(f"[BK_ColorSelector] ○ INPUT hex_colors: {hex_colors}， symbol: {symbol},split_count: {split_count}")
 
-        # 将 str 分割成 list，并去除每个颜色周围的空白
-        color_list = [color.strip() for color in hex_colors.split(symbol)]
-        print(f"[BK_ColorSelector] ├ PROCE Parsed {len(color_list)} colors")
+            # 将 str 分割成 list，并去除每个颜色周围的空白
+            color_list = [color.strip() for color in hex_colors.split(symbol)]
+            print(f"[BK_ColorSelector] ├ PROCE Parsed {len(color_list)} colors")
 
         # 确保值在有效范围内
         split_count = max(1, min(split_count, len(color_list))) - 1
@@ -50,8 +61,8 @@ class BK_ColorSelector:
         selected_color = color_list[split_count]
         print(f"[BK_ColorSelector] ├ PROCE Selected color at index {split_count + 1}")
 
-        # 验证颜色格式
-        if not self.is_valid_hex_color(selected_color):
+        # 验证颜色格式，调色板中的颜色无需再校验
+        if not use_palette and not self.is_valid_hex_color(selected_color):
             print(f"[BK_ColorSelector] ├ ERROR Invalid hex color: {selected_color}")
             raise ValueError(f"[BK_ColorSelector] Invalid hex color: {selected_color}")
 
@@ -1,12 +1,26 @@
-from PIL import Image, ImageDraw
+import hashlib
+import math
 import numpy as np
 import torch
-from torchvision.transforms import ToPILImage
 
-from .functions_image import pil2tensor
+from .functions_color import Palette, parse_hex_palette, read_palette
+from .functions_image import ImageCache
+
+# Pixels generated per row tile of angled and radial gradients
+GRADIENT_TILE_PIXELS = 1 << 20
+
+# Colors sampled along angled and radial gradients, far finer than 8-bit steps
+GRADIENT_LUT_SIZE = 4096
 
 
 class BK_GradientImage:
+    """
+    Node for generating gradient images.
+    Gradients only depend on the node parameters, so generated batches are
+    cached by the full parameter tuple and repeated runs return the cached tensor.
+    """
+
+    gradient_cache = ImageCache()
 
     @classmethod
     def INPUT_TYPES(s):
@@ -26,7 +40,7 @@ class BK_GradientImage:
                         "min": 0, "max": 1, "step": 0.01, }
                 ),
                 "direction": (
-                    ["horizontal", "vertical"],
+                    ["horizontal", "vertical", "angle", "radial"],
                     {"default": "horizontal"},
                 ),
                 "reverse": (
@@ -34,76 +48,119 @@ class BK_GradientImage:
                     {"default": False}
                 )
             },
+            "optional": {
+                "palette": ("PALETTE",),
+                "stops": ("STRING", {"default": "", "multiline": True}),
+                "angle": ("FLOAT", {"default": 45.0, "min": 0.0, "max": 360.0, "step": 1.0}),
+                "precision": (["float32", "float16"], {"default": "float32"}),
+            },
         }
 
     RETURN_TYPES = ("IMAGE",)
     FUNCTION = "main"
     OUTPUT_NODE = False
     CATEGORY = "⭐️ Baikong/Image"
-    DESCRIPTION = "生成指定尺寸的渐变图像，支持水平或垂直方向，可调整起始位置、结束位置和颜色"
+    DESCRIPTION = """
+生成指定尺寸的渐变图像，支持水平、垂直、任意角度（angle，0° 为从左到右，90° 为从上到下）或径向方向，可调整起始位置、结束位置和颜色
+hex_color 可填写多个以英文逗号分隔的颜色，或连接 palette 调色板，每个颜色生成一张渐变，作为一个图像批次输出
+填写 stops 后生成一张多色渐变，格式为 "颜色 位置"，以英文逗号或换行分隔，例如 "#FF0036 0, #34C3EB 0.5, #FFFFFF 1"，省略位置时均匀分布
+precision 选择 float16 可将超大画布的内存减半
+相同参数的渐变会被缓存，重复运行时直接返回缓存结果
+"""
 
     @staticmethod
-    def hex_to_rgb(hex_color):
-        """Convert hex color string to RGB tuple"""
-        # Handle both formats: #FFFFFF or FFFFFF
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) != 6:
-            # Default to white if incorrect format
-            print(f"[BK_GradientImage] ├ WARNING Invalid hex color format: {hex_color}. Using white instead.")
-            hex_color = "FFFFFF"
-        
-        try:
-            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        except ValueError:
-            print(f"[BK_GradientImage] ├ WARNING Could not parse hex color: {hex_color}. Using white instead.")
-            return (255, 255, 255)
-
-    def create_gradient_array(self, width, height, rgb, start_pos, end_pos, direction, reverse):
-        """Create gradient array using numpy for better performance"""
-        # Create empty RGBA array (values 0-255)
-        gradient = np.zeros((height, width, 4), dtype=np.uint8)
-        
-        # Set RGB channels
-        gradient[:, :, 0] = rgb[0]
-        gradient[:, :, 1] = rgb[1]
-        gradient[:, :, 2] = rgb[2]
-        
-        # Determine gradient direction
-        is_horizontal = direction == 'horizontal'
-        size = width if is_horizontal else height
-        
-        # Calculate positions in pixels
-        start = max(0, min(size-1, int(size * start_pos)))
-        end = max(start+1, min(size, int(size * end_pos)))
-        
-        # Create alpha gradient
-        alpha_range = np.linspace(0, 255, end - start).astype(np.uint8)
-        
-        # Apply alpha to the correct dimension
-        if is_horizontal:
-            for i, alpha in enumerate(alpha_range):
-                pos = start + i
-                if pos < width:
-                    gradient[:, pos, 3] = alpha
-            # Fill remaining area with full opacity
-            if end < width:
-                gradient[:, end:, 3] = 255
-        else:
-            for i, alpha in enumerate(alpha_range):
-                pos = start + i
-                if pos < height:
-                    gradient[pos, :, 3] = alpha
-            # Fill remaining area with full opacity
-            if end < height:
-                gradient[end:, :, 3] = 255
-        
-        # Reverse if needed
-        if reverse:
-            if is_horizontal:
-                gradient = gradient[:, ::-1, :]
-            else:
-                gradient = gradient[::-1, :, :]
-        
+    def gradient_cache_key(hex_color="#FFFFFF", width=512, height=512, start_position=0, end_position=1,
+                           direction="horizontal", reverse=False, palette=None, stops="", angle=45.0,
+                           precision="float32", **kwargs):
+        """Build the gradient cache key from every parameter, the connected palette by its colors"""
+        palette_key = palette.rgb.tobytes() if palette is not None and len(palette) else None
+        return (hex_color, width, height, float(start_position), float(end_position), direction, bool(reverse),
+                palette_key, stops, float(angle), precision)
+
+    @classmethod
+    def IS_CHANGED(s, **kwargs):
+        """Gradients are deterministic: only a change of parameters changes the output"""
+        return hashlib.blake2b(repr(s.gradient_cache_key(**kwargs)).encode(), digest_size=16).hexdigest()
+
+    def parse_stops(self, stops):
+        """
+        Parse "color position" entries separated by ',' or new lines into sorted
+        (S,) positions and (S, 3) uint8 colors. Missing positions are spread evenly.
+        """
+        entries = [entry.split() for entry in stops.replace("\n", ",").split(",") if entry.strip()]
+        _, rgb = parse_hex_palette([entry[0] for entry in entries], default="#FFFFFF", name="stop color",
+                                   node="BK_GradientImage")
+
+        even = np.linspace(0, 1, len(entries)) if len(entries) > 1 else np.zeros(1)
+        positions = even.copy()
+        for i, entry in enumerate(entries):
+            if len(entry) < 2:
+                continue
+            try:
+                positions[i] = max(0.0, min(1.0, float(entry[1])))
+            except ValueError:
+                print(f"[BK_GradientImage] ├ WARNING Invalid stop position: {entry[1]}. Using {even[i]:.2f} instead.")
+
+        order = np.argsort(positions, kind="stable")
+        return positions[order], rgb[order]
+
+    def interpolate_stops(self, t, positions, colors):
+        """(N, T, 4) colors of N gradients at the (T,) positions t, clamped beyond the first and last stop"""
+        return np.stack([
+            np.stack([np.interp(t, positions, channel) for channel in gradient.T], axis=-1)
+            for gradient in colors
+        ])
+
+    def create_alpha_ramp(self, size, start_pos, end_pos):
+        """Ramp stops snapped to whole pixels: alpha rises over pixels [start, end) of a size-pixel line"""
+        start = max(0, min(size - 1, int(size * start_pos)))
+        end = max(start + 1, min(size, int(size * end_pos)))
+        # A one-pixel ramp keeps its start pixel transparent, like a ramp of any length
+        return np.array([start, max(end - 1, start + 0.5)], dtype=np.float64) / max(1, size - 1)
+
+    def gradient_positions(self, rows, width, height, direction, angle):
+        """(rows, W) gradient position in [0, 1] of every pixel of a row tile"""
+        x = torch.arange(width, dtype=torch.float32) - (width - 1) / 2
+        y = torch.arange(rows.start, rows.stop, dtype=torch.float32) - (height - 1) / 2
+
+        if direction == "radial":
+            # Distance from the center, 1 at the corners
+            radius = max(1e-6, math.hypot((width - 1) / 2, (height - 1) / 2))
+            return torch.hypot(x[None, :], y[:, None]).div_(radius)
+
+        # Projection on the angle, 0 and 1 at the first and last corner reached
+        cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+        extent = max(1e-6, abs(cos) * (width - 1) + abs(sin) * (height - 1))
+        return (x[None, :] * (cos / extent) + y[:, None] * (sin / extent)).add_(0.5)
+
+    def create_gradient_batch(self, width, height, positions, colors, direction, reverse, angle=45.0,
+                              dtype=torch.float32, tile_pixels=GRADIENT_TILE_PIXELS):
+        """
+        (N, H, W, 4) RGBA gradients of N color stop sets (N, S, 4) at positions (S,) into one
+        preallocated tensor. Horizontal and vertical gradients broadcast one exact line profile;
+        angled and radial gradients are generated in row tiles through a color lookup table,
+        so no full-size intermediate is allocated.
+        """
+        gradient = torch.empty((len(colors), height, width, 4), dtype=dtype)
+
+        if direction in ("horizontal", "vertical"):
+            size = width if direction == "horizontal" else height
+            profile = torch.from_numpy(self.interpolate_stops(np.linspace(0, 1, size), positions, colors)).to(dtype)
+            if reverse:
+                profile = profile.flip(1)
+            gradient[...] = profile[:, None, :, :] if direction == "horizontal" else profile[:, :, None, :]
+            return gradient
+
+        t = np.linspace(0, 1, GRADIENT_LUT_SIZE)
+        lut = torch.from_numpy(self.interpolate_stops(1 - t if reverse else t, positions, colors)).to(dtype)
+        tile_rows = max(1, tile_pixels // width)
+        for start in range(0, height, tile_rows):
+            rows = range(start, min(height, start + tile_rows))
+            index = self.gradient_positions(rows, width, height, direction, angle)
+            index = index.clamp_(0, 1).mul_(GRADIENT_LUT_SIZE - 1).round_().to(torch.int32).view(-1)
+            for i in range(len(colors)):
+                torch.index_select(lut[i], 0, index, out=gradient[i, rows.start:rows.stop].view(-1, 4))
+
         return gradient
 
     def main(
@@ -114,42 +171,70 @@ class BK_GradientImage:
         start_position: float = 0,
         end_position: float = 1,
         direction: str = "horizontal",
-        reverse: bool = False
+        reverse: bool = False,
+        palette: Palette = None,
+        stops: str = "",
+        angle: float = 45.0,
+        precision: str = "float32",
     ):
-        """Generate a gradient image with the specified parameters"""
+        """Generate one gradient image per color, or one multi-stop gradient, with the specified parameters"""
+        cache_key = self.gradient_cache_key(hex_color, width, height, start_position, end_position, direction,
+                                            reverse, palette, stops, angle, precision)
+        gradient = self.gradient_cache.get(cache_key)
+        if gradient is not None:
+            print(f"[BK_GradientImage] ○ OUTPUT Using cached gradient, Image shape: {tuple(gradient.shape)}")
+            return (gradient,)
+
         # Input validation
         width = max(1, width)
         height = max(1, height)
         start_position = max(0.0, min(1.0, start_position))
         end_position = max(start_position + 0.01, min(1.0, end_position))
-        
-        # Convert hex color to RGB
-        rgb = self.hex_to_rgb(hex_color)
-        
-        # Create gradient using numpy array
-        gradient_array = self.create_gradient_array(
-            width, height, rgb, start_position, end_position, direction, reverse
+        dtype = torch.float16 if precision == "float16" else torch.float32
+
+        if stops.strip():
+            # One opaque gradient through every stop
+            positions, rgb = self.parse_stops(stops)
+            colors = np.concatenate([rgb / 255.0, np.ones((len(rgb), 1))], axis=1)[None]
+            print(f"[BK_GradientImage] ○ INPUT {len(rgb)} stops at {', '.join(f'{p:.2f}' for p in positions)}, "
+                  f"Size: {width}x{height}, Direction: {direction}")
+        else:
+            # One alpha ramp per color, from transparent at the start to opaque at the end
+            hex_colors, rgb = read_palette(palette, hex_color, default="#FFFFFF", name="hex color",
+                                           node="BK_GradientImage")
+            if direction in ("horizontal", "vertical"):
+                positions = self.create_alpha_ramp(width if direction == "horizontal" else height,
+                                                   start_position, end_position)
+            else:
+                positions = np.array([start_position, end_position])
+            colors = np.zeros((len(rgb), 2, 4))
+            colors[:, :, :3] = rgb[:, None, :] / 255.0
+            colors[:, 1, 3] = 1
+            print(f"[BK_GradientImage] ○ INPUT Colors: {', '.join(hex_colors)}, Size: {width}x{height}, "
+                  f"Direction: {direction}")
+
+        gradient = self.create_gradient_batch(
+            width, height, positions, colors, direction, reverse, angle, dtype
         )
-        
-        # Convert numpy array to PIL Image
-        image = Image.fromarray(gradient_array, 'RGBA')
-        
-        # Convert to tensor and return
-        return (pil2tensor(image),)
+
+        self.gradient_cache.put(cache_key, gradient)
+        print(f"[BK_GradientImage] ○ OUTPUT Image shape: {tuple(gradient.shape)}, dtype: {precision}")
+        return (gradient,)
 
 
 # if __name__ == "__main__":
+#     from .functions_image import tensor2pil
 #     BK_GradientImage = BK_GradientImage()
 #     image = BK_GradientImage.main(
-#         hex_color="#34C3EB",
+#         hex_color="#34C3EB, #FF0036",
 #         width=512,
 #         height=512,
 #         start_position=0.5,
 #         end_position=1,
 #         direction='vertical',
 #         reverse=False
-#     )
+#     )[0]
 #     # 把 Tensor 转化回 PIL 图片
-#     image_pil = ToPILImage()(image[0].squeeze(0) * 255).convert('RGBA')
+#     image_pil = tensor2pil(image[0])
 #     # 显示图片
 #     image_pil.show()
@@ -1,5 +1,4 @@
 from PIL import Image
-import numpy as np
 import os
 import platform
 import subprocess
@@ -87,8 +86,7 @@ class BK_PrintImage:
         
         counter = self.find_highest_numeric_value(out_path, filename_prefix) + 1
         
-        output_image = image[0].cpu().numpy()
-        img = Image.fromarray(np.clip(output_image * 255.0, 0, 255).astype(np.uint8))
+        img = tensor2pil(image[0])
         
         output_filename = f"{filename_prefix}_{counter:05}"
         img_params = {'png': {'compress_level': 4}}
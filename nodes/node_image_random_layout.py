@@ -4,7 +4,7 @@ from PIL import Image, ImageDraw
 import random
 import cv2
 from skimage.morphology import skeletonize
-from .functions_image import tensor2pil, pil2tensor
+from .functions_image import tensor2pil, tensor2pil_batch, pil2tensor
 
 
 class BK_ImageRandomLayout:
@@ -288,7 +288,11 @@ Extract black lines from path_image as a path, and scatter batch images along th
         canvas_with_path.alpha_composite(path_img_rgba, (0, 0))
         
         # Preprocess image list
-        pil_image_list = [tensor2pil(img).convert('RGBA') for img in image_list]
+        # Every frame of every batch, RGBA frames stay views of the converted batch
+        pil_image_list = [
+            pil_img if pil_img.mode == 'RGBA' else pil_img.convert('RGBA')
+            for img in image_list for pil_img in tensor2pil_batch(img)
+        ]
         
         # Select images based on mode
         selected_images, image_indices = self.select_images(
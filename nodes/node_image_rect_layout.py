@@ -179,8 +179,9 @@ Find the bounding rectangle of black elements in the input image and place a sui
         aspect_ratios = []
         
         for i, img in enumerate(image_list):
-            pil_img = tensor2pil(img)
-            img_aspect_ratio = pil_img.width / pil_img.height if pil_img.height > 0 else 0
+            # The aspect ratio only needs the tensor shape, no PIL conversion
+            img_height, img_width = img.shape[-3:-1]
+            img_aspect_ratio = img_width / img_height if img_height > 0 else 0
             
             # Calculate difference from target aspect ratio
             difference = self.calculate_aspect_ratio_difference(img_aspect_ratio, target_aspect_ratio)
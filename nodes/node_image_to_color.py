@@ -2,19 +2,29 @@
 Image to Color Node - Extract dominant colors from an input image using K-means clustering.
 Allows selecting a specific color from the extraction results.
 """
-from typing import Tuple, List, Dict, Any, Union
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict, Any, Union, Optional
 import torch
 import numpy as np
 from numpy import ndarray
-from sklearn.cluster import KMeans
+from .functions_color import Palette, rgb_to_hex_array
+from .functions_palette import (
+    PALETTE_ENGINES, STREAMING_ENGINES, STREAMING_MEMORY_MB, TENSOR_ENGINES, PaletteCache,
+    auto_num_colors, match_palette, native_thread_limits, sort_palette, streaming_chunk_size, tensor_digest,
+)
 
 
 class BK_Img2Color:
     """
     Extract dominant colors from an input image using K-means clustering.
     Allows selecting specific colors and generating complementary colors.
+    Fitted palettes are cached by image content, so changing only the
+    selection parameters does not re-run the clustering.
     """
 
+    palette_cache = PaletteCache()
+
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -22,6 +32,7 @@ class BK_Img2Color:
                 "input_image": ("IMAGE",),
             },
             "optional": {
+                "mask": ("MASK",),
                 "num_colors": ("INT", {"default": 1, "min": 1, }),
                 "get_complementary_color": (
                     "BOOLEAN",
@@ -50,104 +61,433 @@ class BK_Img2Color:
                     "default": 1,
                     "min": 1,
                 }),
+                "alpha_threshold": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 1.0,
+                    "step": 0.01,
+                    "display": "slider",
+                }),
+                "engine": (list(PALETTE_ENGINES), {"default": "exact"}),
+                "max_memory_mb": ("INT", {
+                    "default": STREAMING_MEMORY_MB,
+                    "min": 16,
+                    "max": 65536,
+                    "step": 16,
+                }),
+                "per_frame": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "label_off": "false",
+                        "label_on": "true",
+                    },
+                ),
+                "temporal": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "label_off": "false",
+                        "label_on": "true",
+                    },
+                ),
+                # New widgets go last: saved workflows restore widget values by position
+                "auto_num_colors": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "label_off": "false",
+                        "label_on": "true",
+                    },
+                ),
             }
         }
 
-    RETURN_TYPES = ("STRING", "STRING",)
-    RETURN_NAMES = ("COLORS", "SELECT_COLOR",)
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING", "PALETTE", "PALETTE",)
+    RETURN_NAMES = ("COLORS", "SELECT_COLOR", "FRAME_COLORS", "FRAME_SELECT_COLOR", "PALETTE", "FRAME_PALETTE",)
+    OUTPUT_IS_LIST = (False, False, True, True, False, True,)
     CATEGORY = "⭐️ Baikong/Color"
     FUNCTION = "main"
     # OUTPUT_NODE = True
-    DESCRIPTION = "从输入图像中提取主要颜色，可指定颜色数量，支持排除特定颜色，并可选择生成互补色"
+    DESCRIPTION = "从输入图像中提取主要颜色，可指定颜色数量，支持排除特定颜色，并可选择生成互补色；开启 per_frame 后为批次中的每一帧分别提取调色板；PALETTE 输出包含颜色及其像素占比，可直接连接到其他颜色节点"
 
     @staticmethod
-    def rgb_to_hex(color: Tuple[int, int, int]) -> str:
-        """Convert RGB tuple to hexadecimal color string"""
-        return f"#{color[0]:02x}{color[1]:02x}{color[2]:02x}"
+    def fallback_colors(image: torch.Tensor) -> Optional[Palette]:
+        """Return fallback colors for images that cannot be clustered, None if the image is valid"""
+        if len(image.shape) >= 3 and image.shape[-1] >= 3:
+            return None
+
+        print(f"[BK_Img2Color] ├ WARNING Invalid image format with shape {image.shape}. Expected RGB/RGBA image.")
+        # Create fallback values for grayscale images
+        if len(image.shape) == 3 and image.shape[-1] == 1:
+            # Convert grayscale to RGB
+            gray_value = int(image.mean().item() * 255)
+            return Palette([(gray_value, gray_value, gray_value)])
+        return Palette([(128, 128, 128)])  # Default gray if completely invalid
 
     @staticmethod
-    def hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
-        """Convert hexadecimal color string to RGB tuple"""
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    def visible_pixels(image: torch.Tensor,
+                       mask: Optional[torch.Tensor],
+                       alpha_threshold: float,
+                       per_frame: bool = False) -> Optional[torch.Tensor]:
+        """
+        Boolean tensor of the pixels to cluster, shaped like image[..., 0].
+        A pixel is kept when its alpha, multiplied by (1 - mask) if a mask is
+        given, is above alpha_threshold. Returns None when nothing is pruned.
+        """
+        alpha = image[..., 3] if image.shape[-1] > 3 else None
+
+        if mask is not None:
+            mask = mask.reshape(-1, *mask.shape[-2:]).to(image.device)
+            # One mask for the whole batch or one per frame, matching the frame size
+            batch_matches = len(image.shape) == 3 or mask.shape[0] in (1, image.shape[0])
+            if mask.shape[-2:] != image.shape[-3:-1] or not batch_matches:
+                print(f"[BK_Img2Color] ├ WARNING Mask shape {tuple(mask.shape)} does not match image shape "
+                      f"{tuple(image.shape)}. Ignoring mask.")
+            else:
+                if len(image.shape) == 3:
+                    mask = mask[0]
+                # Masked areas are transparent, same as BK_ImageList
+                alpha = 1 - mask if alpha is None else alpha * (1 - mask)
+
+        if alpha is None:
+            return None
+
+        keep = (alpha > alpha_threshold).expand(image.shape[:-1])
+        if bool(keep.all()):
+            return None
+
+        # Fall back to all pixels where nothing would be left to cluster
+        if per_frame and len(image.shape) == 4:
+            empty = ~keep.reshape(keep.shape[0], -1).any(dim=1)
+            if bool(empty.any()):
+                print(f"[BK_Img2Color] ├ WARNING {int(empty.sum())} frames have no visible pixels. Using all pixels.")
+                keep = keep.clone()
+                keep[empty] = True
+        elif not bool(keep.any()):
+            print("[BK_Img2Color] ├ WARNING No visible pixels. Using all pixels.")
+            return None
+
+        return keep
 
     @staticmethod
-    def rgb_to_complementary(colors: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
-        """Generate complementary colors by inverting RGB values"""
-        return [(255 - color[0], 255 - color[1], 255 - color[2]) for color in colors]
+    def flatten_pixels(image: torch.Tensor,
+                       engine: str,
+                       keep: Optional[torch.Tensor] = None,
+                       frames: bool = False) -> Union[ndarray, List[ndarray], torch.Tensor]:
+        """
+        Flatten an image into pixel rows for the chosen engine.
+        Tensor engines get an (N, C) tensor view and read it themselves,
+        pruning with keep as they go; the others get a (N, 3) numpy array of the
+        kept pixels. With frames=True the leading batch dimension is kept, giving
+        one row block per frame (a list of arrays when pixels are pruned).
+        """
+        leading = (image.shape[0],) if frames else ()
+        if engine in TENSOR_ENGINES:
+            return image.reshape(*leading, -1, image.shape[-1])
+
+        pixels = image[..., :3].reshape(*leading, -1, 3)
+        if keep is None:
+            return pixels.cpu().numpy()
+        if frames:
+            keep = keep.reshape(image.shape[0], -1)
+            return [frame[frame_keep].cpu().numpy() for frame, frame_keep in zip(pixels, keep)]
+        return pixels[keep.reshape(-1)].cpu().numpy()
 
     @staticmethod
-    def ndarrays_to_rgb(colors: List[ndarray]) -> List[Tuple[int, int, int]]:
-        """Convert numpy arrays of colors to RGB tuples"""
-        return [(int(min(255, max(0, color[0]))), 
-                 int(min(255, max(0, color[1]))), 
-                 int(min(255, max(0, color[2])))) for color in colors]
-
-    def filter_excluded_colors(self, colors: List[str], excluded: List[str]) -> List[str]:
-        """Filter out excluded colors from the list"""
-        if not excluded:
-            return colors
-        
-        # Perform caseless comparison for exclusion
-        return [color for color in colors if color.lower() not in excluded]
-        
-    def remove_duplicate_colors(self, colors: List[str]) -> List[str]:
-        """Remove duplicate colors while preserving order"""
-        seen = set()
-        unique_colors = []
-        for color in colors:
-            # Use lowercase for comparison but keep original case in result
-            if color.lower() not in seen:
-                seen.add(color.lower())
-                unique_colors.append(color)
-        return unique_colors
-
-    def extract_colors(self, image: torch.Tensor, num_colors: int, max_iterations: int) -> List[Tuple[int, int, int]]:
+    def palette_cache_key(image: torch.Tensor,
+                          num_colors: int,
+                          max_iterations: int,
+                          engine: str,
+                          max_memory_mb: int,
+                          init: Optional[ndarray] = None,
+                          keep: Optional[torch.Tensor] = None) -> tuple:
+        """Build the palette cache key from the image content and the fit parameters"""
+        # The memory ceiling only changes the result of streaming engines
+        memory_key = max_memory_mb if engine in STREAMING_ENGINES else None
+        init_key = None if init is None else init.tobytes()
+        keep_key = None if keep is None else tensor_digest(keep)
+        return (tensor_digest(image), num_colors, max_iterations, engine, memory_key, init_key, keep_key)
+
+    def fit_colors(self,
+                   pixels: Union[ndarray, torch.Tensor],
+                   num_colors: int,
+                   max_iterations: int,
+                   engine: str = "exact",
+                   max_memory_mb: int = STREAMING_MEMORY_MB,
+                   init: Optional[ndarray] = None,
+                   keep: Optional[torch.Tensor] = None) -> Tuple[ndarray, ndarray]:
+        """
+        Cluster pixel rows with the chosen engine.
+        keep is only used by tensor engines, the other engines receive
+        already pruned pixels.
+        Returns (centers, counts) sorted by frequency, or, when warm-started from
+        init, ordered so every center keeps the index of its init center.
+        """
+        # Calculate appropriate number of init attempts based on accuracy
+        n_init = max(1, min(10, int(max_iterations / 100)))
+
+        # A warm start is already close to convergence: single init, few iterations
+        if init is not None:
+            max_iterations = max(5, max_iterations // 20)
+
+        if keep is not None:
+            keep = keep.reshape(-1)
+
+        if engine in STREAMING_ENGINES:
+            chunk_size = streaming_chunk_size(num_colors, max_memory_mb)
+            centers, counts = PALETTE_ENGINES[engine](pixels, num_colors, max_iterations, n_init, chunk_size,
+                                                      init=init, keep=keep)
+        elif engine in TENSOR_ENGINES:
+            centers, counts = PALETTE_ENGINES[engine](pixels, num_colors, max_iterations, n_init,
+                                                      init=init, keep=keep)
+        else:
+            palette_engine = PALETTE_ENGINES.get(engine, PALETTE_ENGINES["exact"])
+            centers, counts = palette_engine(pixels, num_colors, max_iterations, n_init, init=init)
+
+        if init is not None:
+            return match_palette(centers, counts, init)
+
+        # Sort colors by cluster size (most frequent first)
+        return sort_palette(centers, counts)
+
+    @staticmethod
+    def to_palette(palette: Tuple[ndarray, ndarray]) -> Palette:
+        """Convert sorted (centers, counts) to a Palette weighted by cluster size"""
+        centers, counts = palette
+        return Palette(np.clip(centers * 255, 0, 255).astype(np.uint8), counts)
+
+    def select_num_colors(self,
+                          image: torch.Tensor,
+                          max_iterations: int,
+                          mask: Optional[torch.Tensor] = None,
+                          alpha_threshold: float = 0.0) -> Optional[int]:
+        """
+        Choose the number of colors for the visible pixels of the whole batch, None on failure.
+        The search runs on a pixel sample drawn from the (N, C) view and its result is cached
+        like a palette, so repeated runs skip it.
+        """
+        if self.fallback_colors(image) is not None:
+            return None
+
+        try:
+            keep = self.visible_pixels(image, mask, alpha_threshold)
+            cache_key = self.palette_cache_key(image, "auto", max_iterations, "auto", 0, keep=keep)
+            num_colors = self.palette_cache.get(cache_key)
+            if num_colors is None:
+                num_colors = auto_num_colors(image.reshape(-1, image.shape[-1]), 20, max_iterations, keep=keep)
+                self.palette_cache.put(cache_key, num_colors)
+            return num_colors
+        except Exception as e:
+            print(f"[BK_Img2Color] ├ ERROR Failed to choose the number of colors: {str(e)}")
+            return None
+
+    def extract_colors(self,
+                       image: torch.Tensor,
+                       num_colors: int,
+                       max_iterations: int,
+                       engine: str = "exact",
+                       max_memory_mb: int = STREAMING_MEMORY_MB,
+                       mask: Optional[torch.Tensor] = None,
+                       alpha_threshold: float = 0.0) -> Palette:
         """Extract dominant colors from image using K-means clustering"""
         try:
             # Handle potential shape issues
-            if len(image.shape) < 3 or image.shape[-1] < 3:
-                print(f"[BK_Img2Color] ├ WARNING Invalid image format with shape {image.shape}. Expected RGB/RGBA image.")
-                # Create fallback values for grayscale images
-                if len(image.shape) == 3 and image.shape[-1] == 1:
-                    # Convert grayscale to RGB
-                    gray_value = int(image.mean().item() * 255)
-                    return [(gray_value, gray_value, gray_value)]
-                return [(128, 128, 128)]  # Default gray if completely invalid
-                
-            # Prepare pixels for clustering
-            if image.shape[-1] > 3:  # Handle alpha channel if present
-                pixels = image[..., :3].reshape(-1, 3).numpy()  # Use only RGB channels
-            else:
-                pixels = image.reshape(-1, image.shape[-1]).numpy()
-                
-            # Calculate appropriate number of init attempts based on accuracy
-            n_init = max(1, min(10, int(max_iterations / 100)))
-            
-            # Perform K-means clustering
-            kmeans = KMeans(
-                n_clusters=num_colors, 
-                algorithm="lloyd",
-                max_iter=max_iterations, 
-                n_init=n_init,
-                random_state=42  # For reproducibility
-            )
-            
-            # Fit and extract colors
-            kmeans.fit(pixels)
-            colors = kmeans.cluster_centers_ * 255
-            
-            # Sort colors by cluster size (most frequent first)
-            color_counts = np.bincount(kmeans.labels_)
-            sorted_indices = np.argsort(color_counts)[::-1]
-            sorted_colors = colors[sorted_indices]
-            
-            # Convert to RGB tuples
-            return self.ndarrays_to_rgb(sorted_colors)
-            
+            fallback = self.fallback_colors(image)
+            if fallback is not None:
+                return fallback
+
+            # Drop transparent and masked pixels before clustering
+            keep = self.visible_pixels(image, mask, alpha_threshold)
+
+            # Reuse the fitted palette when only post-processing parameters changed
+            cache_key = self.palette_cache_key(image, num_colors, max_iterations, engine, max_memory_mb, keep=keep)
+            palette = self.palette_cache.get(cache_key)
+            if palette is not None:
+                print("[BK_Img2Color] ├ PROCE Using cached palette")
+                return self.to_palette(palette)
+
+            # Prepare pixels for clustering, using only RGB channels
+            pixels = self.flatten_pixels(image, engine, keep)
+
+            palette = self.fit_colors(pixels, num_colors, max_iterations, engine, max_memory_mb, keep=keep)
+            self.palette_cache.put(cache_key, palette)
+            return self.to_palette(palette)
+
         except Exception as e:
             print(f"[BK_Img2Color] ├ ERROR Failed to extract colors: {str(e)}")
-            return [(128, 128, 128)]  # Default gray on error
+            return Palette([(128, 128, 128)])  # Default gray on error
+
+    def extract_frame_colors(self,
+                             image: torch.Tensor,
+                             num_colors: int,
+                             max_iterations: int,
+                             engine: str = "exact",
+                             max_memory_mb: int = STREAMING_MEMORY_MB,
+                             mask: Optional[torch.Tensor] = None,
+                             alpha_threshold: float = 0.0) -> List[Palette]:
+        """Extract one palette per frame of a (B, H, W, C) batch, fitting frames in parallel"""
+        fallback = self.fallback_colors(image)
+        if fallback is not None:
+            return [fallback]
+
+        frames = image if len(image.shape) == 4 else image.unsqueeze(0)
+        keep = self.visible_pixels(frames, mask, alpha_threshold, per_frame=True)
+        frame_keep = [None] * len(frames) if keep is None else list(keep)
+
+        # K-means releases the GIL while fitting, so frames are clustered concurrently.
+        # Every fit would otherwise start its own OpenMP / torch pool of cpu_count threads,
+        # so the native pools are split between the workers instead of oversubscribed.
+        max_workers = max(1, min(len(frames), os.cpu_count() or 1))
+        worker_threads = max(1, (os.cpu_count() or 1) // max_workers)
+
+        # Concurrent streaming fits share the memory ceiling
+        frame_memory_mb = max(1, max_memory_mb // max_workers)
+
+        with native_thread_limits(worker_threads), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Look up every frame in the palette cache first
+            cache_keys = list(executor.map(
+                lambda frame, keep: self.palette_cache_key(
+                    frame, num_colors, max_iterations, engine, frame_memory_mb, keep=keep),
+                frames, frame_keep))
+            palettes = [self.palette_cache.get(key) for key in cache_keys]
+            missing = [i for i, palette in enumerate(palettes) if palette is None]
+
+            if missing:
+                # Flatten the whole batch once, shared by all frames still to be fitted
+                pixels = self.flatten_pixels(frames, engine, keep, frames=True)
+
+                def fit_frame(index: int) -> Optional[Tuple[ndarray, ndarray]]:
+                    try:
+                        with native_thread_limits(worker_threads, global_pools=False):
+                            palette = self.fit_colors(pixels[index], num_colors, max_iterations, engine,
+                                                      frame_memory_mb, keep=frame_keep[index])
+                    except Exception as e:
+                        print(f"[BK_Img2Color] ├ ERROR Failed to extract frame colors: {str(e)}")
+                        return None
+                    self.palette_cache.put(cache_keys[index], palette)
+                    return palette
+
+                for index, palette in zip(missing, executor.map(fit_frame, missing)):
+                    palettes[index] = palette
+
+        if len(missing) < len(frames):
+            print(f"[BK_Img2Color] ├ PROCE Using cached palettes for {len(frames) - len(missing)} frames")
+
+        # Default gray for frames that failed to fit
+        return [self.to_palette(palette) if palette is not None else Palette([(128, 128, 128)])
+                for palette in palettes]
+
+    def track_frame_colors(self,
+                           image: torch.Tensor,
+                           num_colors: int,
+                           max_iterations: int,
+                           engine: str = "exact",
+                           max_memory_mb: int = STREAMING_MEMORY_MB,
+                           mask: Optional[torch.Tensor] = None,
+                           alpha_threshold: float = 0.0) -> List[Palette]:
+        """
+        Extract one palette per frame, seeding each frame with the previous frame's centers.
+        The first palette is sorted by frequency; later frames keep the index of the
+        matching color, so select_color refers to the same color across the sequence.
+        """
+        fallback = self.fallback_colors(image)
+        if fallback is not None:
+            return [fallback]
+
+        frames = image if len(image.shape) == 4 else image.unsqueeze(0)
+        keep = self.visible_pixels(frames, mask, alpha_threshold, per_frame=True)
+        frame_keep = [None] * len(frames) if keep is None else list(keep)
+        pixels = None
+        previous = None
+        frame_colors = []
+        cached_frames = 0
+
+        for index, frame in enumerate(frames):
+            # Warm start only when the previous frame produced a full palette
+            init = previous if previous is not None and len(previous) == num_colors else None
+
+            cache_key = self.palette_cache_key(frame, num_colors, max_iterations, engine, max_memory_mb, init,
+                                               frame_keep[index])
+            palette = self.palette_cache.get(cache_key)
+            if palette is not None:
+                cached_frames += 1
+            else:
+                if pixels is None:
+                    # Flatten the whole batch once, on the first frame that needs fitting
+                    pixels = self.flatten_pixels(frames, engine, keep, frames=True)
+                try:
+                    palette = self.fit_colors(pixels[index], num_colors, max_iterations, engine, max_memory_mb, init,
+                                              frame_keep[index])
+                except Exception as e:
+                    print(f"[BK_Img2Color] ├ ERROR Failed to extract frame colors: {str(e)}")
+                    frame_colors.append(Palette([(128, 128, 128)]))  # Default gray on error
+                    continue
+
+                # Keep indices stable for engines that cannot be warm-started
+                if previous is not None and init is None:
+                    palette = match_palette(*palette, previous)
+                self.palette_cache.put(cache_key, palette)
+
+            previous = palette[0]
+            frame_colors.append(self.to_palette(palette))
+
+        if cached_frames:
+            print(f"[BK_Img2Color] ├ PROCE Using cached palettes for {cached_frames} frames")
+
+        return frame_colors
+
+    def process_colors(self,
+                       palette: Palette,
+                       get_complementary_color: bool,
+                       excluded: List[str],
+                       select_color: int,
+                       verbose: bool = True) -> Tuple[List[str], str, Palette]:
+        """
+        Apply complementary, deduplication, exclusion and selection to an extracted palette.
+        Returns the remaining hex colors, the selected color and the remaining palette.
+        """
+        rgb = palette.rgb
+
+        # Generate complementary colors if requested, by inverting RGB values
+        if get_complementary_color:
+            rgb = 255 - rgb
+            if verbose:
+                print("[BK_Img2Color] ├ PROCE Generated complementary colors")
+
+        # Convert to hex format
+        hex_colors = rgb_to_hex_array(rgb)
+
+        # Remove any duplicate colors, keeping the first one and merging their weights
+        _, first, inverse = np.unique(hex_colors, return_index=True, return_inverse=True)
+        weights = np.bincount(inverse.reshape(-1), weights=palette.weights)
+        order = np.argsort(first)
+        unique = first[order]
+        weights = weights[order]
+
+        # Filter excluded colors
+        keep = np.array([hex_colors[i] not in excluded for i in unique], dtype=bool)
+        if verbose and not keep.all():
+            print(f"[BK_Img2Color] ├ PROCE Excluded {int((~keep).sum())} colors")
+
+        # Handle empty result after exclusion
+        if not keep.any():
+            if verbose:
+                print("[BK_Img2Color] ├ WARNING All colors were excluded. Using default gray.")
+            filtered = Palette([(128, 128, 128)])  # Default gray
+        else:
+            filtered = Palette(rgb[unique[keep]], weights[keep])
+        filtered_colors = filtered.to_hex()
+
+        # Select specific color
+        if select_color > len(filtered_colors):
+            selected_color = filtered_colors[-1]  # Last color if index out of range
+            if verbose:
+                print(f"[BK_Img2Color] ├ WARNING Select index {select_color} out of range, using last color")
+        else:
+            selected_color = filtered_colors[select_color - 1]  # 1-based indexing
+
+        return filtered_colors, selected_color, filtered
 
     def main(self, 
              input_image: torch.Tensor, 
@@ -155,7 +495,14 @@ class BK_Img2Color:
              accuracy: int = 80,
              get_complementary_color: bool = False, 
              exclude_colors: str = "", 
-             select_color: int = 1) -> Dict[str, Any]:
+             select_color: int = 1,
+             engine: str = "exact",
+             max_memory_mb: int = STREAMING_MEMORY_MB,
+             per_frame: bool = False,
+             temporal: bool = False,
+             mask: Optional[torch.Tensor] = None,
+             alpha_threshold: float = 0.0,
+             auto_num_colors: bool = False) -> Dict[str, Any]:
         """
         Extract dominant colors from an input image.
         
@@ -166,13 +513,32 @@ class BK_Img2Color:
             get_complementary_color: Whether to generate complementary colors
             exclude_colors: Comma-separated list of hex colors to exclude
             select_color: Index of color to select (1-based)
+            engine: Clustering engine, "exact" fits every pixel, "histogram" fits
+                the occupied bins of a 3D color histogram weighted by pixel count,
+                "streaming" feeds fixed-size chunks to a mini-batch K-means,
+                "median_cut" and "fast_octree" use the PIL quantizers,
+                "torch" runs K-means directly on the image tensor
+            max_memory_mb: Memory ceiling of the streaming engine in megabytes
+            per_frame: Extract a separate palette for every frame of the batch
+            temporal: Track palettes across frames (implies per_frame), warm-starting
+                each frame from the previous one and keeping color indices stable
+            mask: Optional mask, masked (1) pixels are ignored like transparent ones
+            alpha_threshold: Pixels with alpha at or below this value are ignored
+            auto_num_colors: Choose num_colors (up to 20) with an elbow criterion
+                on a pixel subsample instead of using the given value
             
         Returns:
-            Dictionary with UI information and result tuple of (all_colors, selected_color)
+            Dictionary with UI information and result tuple of
+            (all_colors, selected_color, frame_colors, frame_selected_colors,
+            palette, frame_palettes). The PALETTE outputs carry the colors with
+            their pixel share as weights. In per-frame mode all_colors holds one
+            palette per line, selected_color the comma-separated selection of
+            every frame and palette the colors of all frames together.
         """
         # Parameter validation
         num_colors = max(1, min(20, num_colors))  # Limit to reasonable range
         accuracy = max(1, min(100, accuracy))
+        alpha_threshold = max(0.0, min(1.0, alpha_threshold))
         select_color = max(1, select_color)
         
         # Calculate k-means iterations based on accuracy
@@ -184,52 +550,65 @@ class BK_Img2Color:
         
         # Log input parameters
         print(f"[BK_Img2Color] ○ INPUT Image shape: {input_image.shape}, "
-              f"Extracting {num_colors} colors with accuracy {accuracy}%")
-        
-        # Extract colors from image
-        rgb_colors = self.extract_colors(input_image, num_colors, max_iterations)
-        print(f"[BK_Img2Color] ├ PROCE Extracted {len(rgb_colors)} colors")
-        
-        # Generate complementary colors if requested
-        if get_complementary_color:
-            rgb_colors = self.rgb_to_complementary(rgb_colors)
-            print("[BK_Img2Color] ├ PROCE Generated complementary colors")
-        
-        # Convert to hex format
-        hex_colors = [self.rgb_to_hex(color) for color in rgb_colors]
-        
-        # Remove any duplicate colors
-        hex_colors = self.remove_duplicate_colors(hex_colors)
-        
-        # Filter excluded colors
-        filtered_colors = self.filter_excluded_colors(hex_colors, excluded)
-        if len(filtered_colors) < len(hex_colors):
-            print(f"[BK_Img2Color] ├ PROCE Excluded {len(hex_colors) - len(filtered_colors)} colors")
-        
-        # Handle empty result after exclusion
-        if not filtered_colors:
-            print("[BK_Img2Color] ├ WARNING All colors were excluded. Using default gray.")
-            filtered_colors = ["#808080"]  # Default gray
-        
-        # Join colors as comma-separated string
-        color_string = ", ".join(filtered_colors)
-        
-        # Select specific color
-        if select_color > len(filtered_colors):
-            selected_color = filtered_colors[-1]  # Last color if index out of range
-            print(f"[BK_Img2Color] ├ WARNING Select index {select_color} out of range, using last color")
+              f"Extracting {'auto' if auto_num_colors else num_colors} colors "
+              f"with accuracy {accuracy}% using {engine} engine")
+
+        if auto_num_colors:
+            selected_num_colors = self.select_num_colors(input_image, max_iterations, mask, alpha_threshold)
+            if selected_num_colors is not None:
+                num_colors = selected_num_colors
+                print(f"[BK_Img2Color] ├ PROCE Auto selected {num_colors} colors")
+
+        if temporal:
+            # Track one palette per frame through the sequence
+            frame_palettes = self.track_frame_colors(
+                input_image, num_colors, max_iterations, engine, max_memory_mb, mask, alpha_threshold)
+        elif per_frame:
+            # Extract one palette per frame
+            frame_palettes = self.extract_frame_colors(
+                input_image, num_colors, max_iterations, engine, max_memory_mb, mask, alpha_threshold)
+
+        if per_frame or temporal:
+            print(f"[BK_Img2Color] ├ PROCE Extracted palettes for {len(frame_palettes)} frames")
+
+            frame_results = [
+                self.process_colors(frame_palette, get_complementary_color, excluded, select_color, verbose=False)
+                for frame_palette in frame_palettes
+            ]
+            frame_colors = [", ".join(colors) for colors, _, _ in frame_results]
+            frame_selected = [selected for _, selected, _ in frame_results]
+            frame_palettes = [frame_palette for _, _, frame_palette in frame_results]
+            palette = Palette.concatenate(frame_palettes)
+
+            color_string = "\n".join(frame_colors)
+            selected_color = ", ".join(frame_selected)
+
+            print(f"[BK_Img2Color] ○ OUTPUT Selected colors: {selected_color}")
+            print(f"[BK_Img2Color] ○ OUTPUT Frame palettes ({len(frame_colors)}):\n{color_string}")
         else:
-            selected_color = filtered_colors[select_color - 1]  # 1-based indexing
-        
-        print(f"[BK_Img2Color] ○ OUTPUT Selected color: {selected_color}")
-        print(f"[BK_Img2Color] ○ OUTPUT All colors ({len(filtered_colors)}): {color_string}")
+            # Extract colors from image
+            extracted = self.extract_colors(
+                input_image, num_colors, max_iterations, engine, max_memory_mb, mask, alpha_threshold)
+            print(f"[BK_Img2Color] ├ PROCE Extracted {len(extracted)} colors")
+
+            filtered_colors, selected_color, palette = self.process_colors(
+                extracted, get_complementary_color, excluded, select_color)
+
+            # Join colors as comma-separated string
+            color_string = ", ".join(filtered_colors)
+            frame_colors = [color_string]
+            frame_selected = [selected_color]
+            frame_palettes = [palette]
+
+            print(f"[BK_Img2Color] ○ OUTPUT Selected color: {selected_color}")
+            print(f"[BK_Img2Color] ○ OUTPUT All colors ({len(filtered_colors)}): {color_string}")
         
         # Return results
         return {
             "ui": {
                 "text": (color_string, selected_color)
             }, 
-            "result": (color_string, selected_color)
+            "result": (color_string, selected_color, frame_colors, frame_selected, palette, frame_palettes)
         }
 
 # if __name__ == "__main__":
@@ -6,12 +6,8 @@ from server import PromptServer
 import os
 import time
 import folder_paths
-import numpy as np
 from PIL import Image
-import torch
-
-def tensor2pil(t_image: torch.Tensor) -> Image.Image:
-    return Image.fromarray(np.clip(255.0 * t_image.cpu().numpy().squeeze(), 0, 255).astype(np.uint8))
+from .functions_image import tensor2pil
 
 class BK_ImageToSVG:
 
@@ -0,0 +1,100 @@
+"""
+Cross-check the array helpers in nodes/functions_color.py against colorsys and
+the scalar helpers they replace.
+
+Usage: python -m pytest tests
+"""
+import os
+import sys
+import colorsys
+import numpy as np
+import pytest
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nodes.functions_color import (
+    contrast_ratio, contrast_ratio_array, hex_to_rgb, hsl_to_rgb, hsl_to_rgb_array,
+    hsv_to_rgb_array, hsv_to_rgb_float_array, parse_hex_palette, relative_luminance,
+    relative_luminance_array, rgb_to_hex, rgb_to_hex_array, rgb_to_hsl, rgb_to_hsl_array,
+    rgb_to_hsv_array,
+)
+
+
+# 不查表的亮度公式，作为查表结果的参照
+def formula_luminance(r, g, b):
+    r, g, b = (c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4 for c in (r / 255.0, g / 255.0, b / 255.0))
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+@pytest.fixture(scope="module")
+def rgb():
+    """(N, 3) int colors, gray, black and white ones hit the special cases of the conversions"""
+    rng = np.random.default_rng(42)
+    return np.concatenate([rng.integers(0, 256, (5000, 3)), [[0, 0, 0], [255, 255, 255], [128, 128, 128]]])
+
+
+@pytest.fixture(scope="module")
+def colors(rgb):
+    return [tuple(int(c) for c in color) for color in rgb]
+
+
+@pytest.fixture(scope="module")
+def hsv(colors):
+    return np.array([colorsys.rgb_to_hsv(r / 255.0, g / 255.0, b / 255.0) for r, g, b in colors])
+
+
+@pytest.fixture(scope="module")
+def luminance(colors):
+    return np.array([formula_luminance(*color) for color in colors])
+
+
+@pytest.mark.parametrize("backend", ["numpy", "torch"])
+def test_rgb_to_hsv_array(rgb, hsv, backend):
+    pixels = rgb if backend == "numpy" else torch.from_numpy(rgb).double()
+    h, s, v = (np.asarray(channel) for channel in rgb_to_hsv_array(pixels))
+    assert np.allclose(np.stack([h, s, v], -1), hsv, atol=1e-12)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "torch"])
+def test_hsv_to_rgb_float_array(hsv, backend):
+    channels = hsv.T.copy() if backend == "numpy" else torch.from_numpy(hsv.T.copy())
+    expected = np.array([colorsys.hsv_to_rgb(*color) for color in hsv])
+    assert np.allclose(np.asarray(hsv_to_rgb_float_array(*channels)), expected, atol=1e-12)
+
+
+def test_hsv_to_rgb_array(hsv):
+    truncated = np.array([[int(c * 255.0) for c in colorsys.hsv_to_rgb(*color)] for color in hsv])
+    assert np.array_equal(hsv_to_rgb_array(*hsv.T), truncated)
+
+
+def test_hsl_arrays(rgb, colors):
+    hsl = np.array([rgb_to_hsl(color) for color in colors])
+    assert np.allclose(np.stack(rgb_to_hsl_array(rgb), -1), hsl, atol=1e-12)
+    assert np.array_equal(hsl_to_rgb_array(*hsl.T), [hsl_to_rgb(color) for color in hsl])
+
+
+def test_relative_luminance(colors, luminance):
+    assert np.allclose([relative_luminance(*color) for color in colors], luminance, atol=1e-12)
+    assert np.isclose(relative_luminance(127.5, 0, 0), formula_luminance(127.5, 0, 0))
+
+
+@pytest.mark.parametrize("convert, atol", [
+    (lambda rgb: rgb, 1e-12),
+    (lambda rgb: rgb.astype(np.float64), 1e-12),
+    (lambda rgb: torch.from_numpy(rgb).to(torch.uint8), 1e-6),
+    (lambda rgb: torch.from_numpy(rgb).double(), 1e-12),
+], ids=["int", "float", "uint8 torch", "torch"])
+def test_relative_luminance_array(rgb, luminance, convert, atol):
+    assert np.allclose(np.asarray(relative_luminance_array(convert(rgb))), luminance, atol=atol)
+
+
+def test_contrast_ratio_array(luminance):
+    contrast = np.array([contrast_ratio(a, b) for a, b in zip(luminance, luminance[::-1])])
+    assert np.allclose(contrast_ratio_array(luminance, luminance[::-1]), contrast)
+
+
+def test_hex_arrays(rgb, colors):
+    hex_colors = [rgb_to_hex(color) for color in colors]
+    assert rgb_to_hex_array(rgb) == hex_colors
+    assert np.array_equal(parse_hex_palette(hex_colors)[1], [hex_to_rgb(color) for color in hex_colors])
@@ -34,4 +34,6 @@ function registerColorNode(nodeName) {
 	});
   }
 
-registerColorNode("BK_Img2Color");
\ No newline at end of file
+registerColorNode("BK_Img2Color");
+registerColorNode("BK_ColorContrastMap");
+registerColorNode("BK_ColorContrastMatrix");
\ No newline at end of file